@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import random
+
+import pytest
+
+import synthetic
+from bench_readers import _readers
+from conftest import record_rate
+
+from taxadb import annotate
+from taxadb.schema import Gb
+
+LINES = 200000
+
+
+@pytest.fixture(scope='session')
+def hits(tmpdir_factory, sizes):
+    """A synthetic DIAMOND-like output, with gb accessions in column 2"""
+    path = os.path.join(str(tmpdir_factory.mktemp('hits')), 'hits.tsv')
+    accessions = synthetic.accessions('gb', sizes['accessions'])
+    rand = random.Random(0)
+    with open(path, 'w') as f:
+        for i in range(LINES):
+            f.write('query%d\t%s.1\t98.5\t120\t1e-30\n' % (
+                i, rand.choice(accessions)))
+    return path
+
+
+@pytest.mark.parametrize('processes', _readers())
+def bench_annotate(benchmark, tmpdir, built_db, hits, processes):
+    dbname, kwargs = built_db
+    if kwargs['dbtype'] == 'sqlite':
+        kwargs = dict(kwargs, readonly=True)
+    output = os.path.join(str(tmpdir), 'annotated.tsv')
+    lines = benchmark.pedantic(
+        annotate.annotate, args=(hits, output, dbname, Gb),
+        kwargs=dict(kwargs, processes=processes), rounds=3)
+    benchmark.extra_info['processes'] = processes
+    record_rate(benchmark, LINES)
+    assert lines == LINES
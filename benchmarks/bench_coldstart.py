@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import synthetic
+
+from taxadb import arrays
+from taxadb.schema import Gb
+
+# each scenario runs in a new interpreter, as a short-lived CLI or worker
+# process would: import taxadb, look up one accession number, exit
+SCENARIOS = {
+    'import': 'from taxadb import app',
+    'accession': 'from taxadb import accession\n'
+                 'from taxadb.schema import Gb\n'
+                 'list(accession.taxid([acc], dbname, Gb, **kwargs))',
+    'arrays': 'from taxadb import arrays\n'
+              'from taxadb.schema import Gb\n'
+              'arrays.accession_taxa([acc], dbname, Gb, **kwargs)',
+}
+
+SCRIPT = """
+import json, sys
+dbname, acc, kwargs = json.loads(sys.argv[1])
+%s
+"""
+
+
+@pytest.fixture(scope='session')
+def snapshot_dir(tmpdir_factory, built_db, sizes):
+    """A snapshot of the built database, caching the first gb accessions"""
+    dbname, kwargs = built_db
+    outdir = os.path.join(str(tmpdir_factory.mktemp('snapshot')), 'snapshot')
+    hot = synthetic.accessions('gb', sizes['accessions'])[:1000]
+    arrays.save_snapshot(dbname, outdir, hot, Gb, **kwargs)
+    return outdir
+
+
+def _run(scenario, dbname, acc, kwargs):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    subprocess.check_call(
+        [sys.executable, '-c', SCRIPT % SCENARIOS[scenario],
+         json.dumps([dbname, acc, kwargs])], env=env)
+
+
+@pytest.mark.parametrize('use_snapshot', [False, True])
+@pytest.mark.parametrize('scenario', list(SCENARIOS))
+def bench_coldstart(benchmark, built_db, sizes, snapshot_dir, scenario,
+                    use_snapshot):
+    if use_snapshot and scenario != 'arrays':
+        pytest.skip('only the arrays functions read snapshots')
+    dbname, kwargs = built_db
+    kwargs = dict(kwargs, snapshot=snapshot_dir if use_snapshot else False)
+    acc = synthetic.accessions('gb', sizes['accessions'])[0]
+    benchmark.extra_info['snapshot'] = use_snapshot
+    benchmark.pedantic(_run, args=(scenario, dbname, acc, kwargs), rounds=5)
@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+import os
+
+import pytest
+
+from taxadb import app
+from taxadb.schema import Taxa, Est, Gb, Gss, Wgs, Prot
+
+from conftest import _drop_tables, record_rate
+
+DIVISIONS = ['gb', 'prot', 'full']
+
+
+@pytest.mark.parametrize('division', DIVISIONS)
+def bench_create_db(benchmark, tmpdir, create_args, sizes, division):
+    counter = itertools.count()
+
+    def setup():
+        dbname = os.path.join(str(tmpdir), 'create%d.sqlite' % next(counter))
+        args = create_args(dbname, division=division)
+        if args.dbtype != 'sqlite':
+            _drop_tables(args, [Est, Gb, Gss, Wgs, Prot, Taxa])
+        return (args,), {}
+
+    n_tables = 5 if division == 'full' else 1
+    rows = sizes['taxa'] + n_tables * sizes['accessions']
+    benchmark.extra_info['dbtype'] = create_args().dbtype
+    benchmark.extra_info['rows'] = rows
+    benchmark.pedantic(app.create_db, setup=setup, rounds=3)
+    record_rate(benchmark, rows)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+
+import pytest
+
+import synthetic
+from conftest import BATCH_SIZES, record_rate
+
+from taxadb import accession
+from taxadb import taxid
+from taxadb.schema import Gb
+
+ACCESSION_FUNCTIONS = ['taxid', 'sci_name', 'lineage_id', 'lineage_name']
+TAXID_FUNCTIONS = ['sci_name', 'lineage_id', 'lineage_name']
+
+
+@pytest.mark.parametrize('batch', BATCH_SIZES)
+@pytest.mark.parametrize('function', ACCESSION_FUNCTIONS)
+def bench_accession(benchmark, built_db, sizes, function, batch):
+    if batch > sizes['accessions']:
+        pytest.skip('batch larger than the synthetic gb table')
+    dbname, kwargs = built_db
+    accessions = random.Random(batch).sample(
+        synthetic.accessions('gb', sizes['accessions']), batch)
+    func = getattr(accession, function)
+
+    def lookup():
+        return list(func(accessions, dbname, Gb, **kwargs))
+
+    benchmark.extra_info['batch'] = batch
+    results = benchmark(lookup)
+    record_rate(benchmark, batch)
+    assert len(results) == batch
+
+
+@pytest.mark.parametrize('batch', [1, 100, 1000])
+@pytest.mark.parametrize('function', TAXID_FUNCTIONS)
+def bench_taxid(benchmark, built_db, sizes, function, batch):
+    if batch > sizes['taxa'] - 1:
+        pytest.skip('batch larger than the synthetic taxa table')
+    dbname, kwargs = built_db
+    taxids = random.Random(batch).sample(range(2, sizes['taxa'] + 1), batch)
+    func = getattr(taxid, function)
+
+    def lookup():
+        return [func(t, dbname, **kwargs) for t in taxids]
+
+    benchmark.extra_info['batch'] = batch
+    benchmark(lookup)
+    record_rate(benchmark, batch)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+import synthetic
+
+from taxadb import parse
+from taxadb.schema import db, DatabaseFactory
+
+
+def bench_taxdump(benchmark, dump_dir, sizes):
+    benchmark.extra_info['rows'] = sizes['taxa']
+    taxa = benchmark(
+        parse.taxdump,
+        os.path.join(dump_dir, 'nodes.dmp'),
+        os.path.join(dump_dir, 'names.dmp'))
+    assert len(taxa) == sizes['taxa']
+
+
+@pytest.mark.parametrize('division', sorted(synthetic.ACC_FILES))
+def bench_accession2taxid(benchmark, dump_dir, built_db, sizes, division):
+    dbname, kwargs = built_db
+    database = DatabaseFactory(dbname=dbname, **kwargs).get_database()
+    db.initialize(database)
+    db.connect()
+    acc_file = os.path.join(dump_dir, synthetic.ACC_FILES[division])
+
+    def consume():
+        return sum(len(c) for c in parse.accession2taxid(acc_file, 500))
+
+    benchmark.extra_info['rows'] = sizes['accessions']
+    rows = benchmark(consume)
+    db.close()
+    assert rows == sizes['accessions']
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import os
+import random
+
+import pytest
+
+import synthetic
+from conftest import record_rate
+
+from taxadb import accession
+from taxadb.schema import Gb
+
+BATCH = 100
+BATCHES_PER_READER = 50
+
+
+def _readers():
+    """Reader counts to benchmark: powers of two up to the number of cores"""
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def _read(job):
+    """Run BATCHES_PER_READER lookups of BATCH accessions in a worker"""
+    dbname, kwargs, accessions, seed = job
+    rand = random.Random(seed)
+    rows = 0
+    for _ in range(BATCHES_PER_READER):
+        batch = rand.sample(accessions, BATCH)
+        rows += len(list(accession.taxid(batch, dbname, Gb, **kwargs)))
+    return rows
+
+
+@pytest.mark.parametrize('readonly', [False, True])
+@pytest.mark.parametrize('readers', _readers())
+def bench_concurrent_readers(benchmark, built_db, sizes, readers, readonly):
+    dbname, kwargs = built_db
+    if kwargs['dbtype'] != 'sqlite':
+        pytest.skip('the read-only profile only applies to sqlite')
+    kwargs = dict(kwargs, readonly=readonly)
+    accessions = synthetic.accessions('gb', sizes['accessions'])
+    jobs = [(dbname, kwargs, accessions, seed) for seed in range(readers)]
+
+    def run():
+        with multiprocessing.Pool(readers) as pool:
+            return sum(pool.map(_read, jobs))
+
+    rows = benchmark.pedantic(run, rounds=3)
+    lookups = readers * BATCHES_PER_READER * BATCH
+    benchmark.extra_info['readers'] = readers
+    record_rate(benchmark, lookups)
+    assert rows == lookups
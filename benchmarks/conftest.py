@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import os
+
+import pytest
+
+import synthetic
+
+# the 1000000 batch only runs with --accessions 1000000 or more
+BATCH_SIZES = [1, 100, 10000, 1000000]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('taxadb benchmarks')
+    group.addoption('--taxa', type=int, default=10000,
+                    help='number of synthetic taxa (default: %(default)s)')
+    group.addoption('--accessions', type=int, default=100000,
+                    help='number of synthetic accessions per division '
+                    '(default: %(default)s)')
+    group.addoption('--dbtype', default='sqlite',
+                    choices=['sqlite', 'mysql', 'postgres'],
+                    help='database backend to benchmark (default: '
+                    '%(default)s)')
+    group.addoption('--dbname', default=None,
+                    help='database name, required for mysql and postgres')
+    group.addoption('--hostname', default='localhost')
+    group.addoption('--username', default=None)
+    group.addoption('--password', default=None)
+    group.addoption('--port', default=None)
+
+
+def record_rate(benchmark, rows):
+    """Record the rows processed per second by a benchmark in its extra
+    info. Nothing is recorded under --benchmark-disable, which runs the
+    benchmarks once without timing them."""
+    if benchmark.stats is not None:
+        benchmark.extra_info['rows_per_sec'] = rows / benchmark.stats.stats.mean
+
+
+@pytest.fixture(scope='session')
+def sizes(request):
+    return {
+        'taxa': request.config.getoption('taxa'),
+        'accessions': request.config.getoption('accessions'),
+    }
+
+
+@pytest.fixture(scope='session')
+def dump_dir(tmpdir_factory, sizes):
+    """Directory holding a synthetic taxdump and accession2taxid files"""
+    outdir = str(tmpdir_factory.mktemp('dump'))
+    synthetic.taxdump(outdir, sizes['taxa'])
+    for division in synthetic.ACC_FILES:
+        synthetic.accession2taxid(
+            outdir, division, sizes['accessions'], sizes['taxa'])
+    return outdir
+
+
+@pytest.fixture(scope='session')
+def create_args(request, dump_dir):
+    """Build the arguments of `taxadb create` for a given database name"""
+    config = request.config
+
+    def make(dbname=None, division='full', chunk=500):
+        return argparse.Namespace(
+            input=dump_dir,
+            dbname=config.getoption('dbname') or dbname,
+            dbtype=config.getoption('dbtype'),
+            division=division,
+            chunk=chunk,
+            hostname=config.getoption('hostname'),
+            username=config.getoption('username'),
+            password=config.getoption('password'),
+            port=config.getoption('port'))
+    return make
+
+
+@pytest.fixture(scope='session')
+def built_db(tmpdir_factory, create_args):
+    """A database built once from the synthetic dump, shared by lookups
+
+    Returns the database name and the keyword arguments to pass to the
+    lookup functions.
+    """
+    from taxadb import app
+    from taxadb.schema import Taxa, Est, Gb, Gss, Wgs, Prot
+
+    args = create_args(
+        os.path.join(str(tmpdir_factory.mktemp('db')), 'bench.sqlite'))
+    if args.dbtype != 'sqlite':
+        _drop_tables(args, [Est, Gb, Gss, Wgs, Prot, Taxa])
+    app.create_db(args)
+    kwargs = dict(vars(args))
+    for key in ['input', 'division', 'chunk', 'dbname']:
+        del kwargs[key]
+    return args.dbname, kwargs
+
+
+def _drop_tables(args, tables):
+    """Drop the taxadb tables on a mysql or postgres server"""
+    from taxadb.schema import db, DatabaseFactory
+
+    database = DatabaseFactory(**vars(args)).get_database()
+    db.initialize(database)
+    db.connect()
+    db.drop_tables(tables, safe=True)
+    db.close()
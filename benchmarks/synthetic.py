@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import os
+import random
+
+RANKS = ['superkingdom', 'phylum', 'class', 'order', 'family', 'genus',
+         'species', 'no rank']
+
+# accession prefixes used for each division, loosely modeled on the real ones
+PREFIXES = {
+    'est': ['AA', 'AI', 'BE'],
+    'gb': ['X', 'Z', 'AB', 'KC'],
+    'gss': ['AQ', 'BH', 'CC'],
+    'wgs': ['AAAA', 'JABC', 'MDKE'],
+    'prot': ['AAA', 'CAA', 'XP_'],
+}
+
+ACC_FILES = {
+    'est': 'nucl_est.accession2taxid.gz',
+    'gb': 'nucl_gb.accession2taxid.gz',
+    'gss': 'nucl_gss.accession2taxid.gz',
+    'wgs': 'nucl_wgs.accession2taxid.gz',
+    'prot': 'prot.accession2taxid.gz',
+}
+
+
+def taxdump(outdir, n_taxa, seed=0):
+    """Write a synthetic nodes.dmp and names.dmp in outdir
+
+    The tree is rooted at taxid 1 (named 'root'), and every other taxon picks
+    its parent among the taxa written before it.
+
+    Arguments:
+    outdir -- output directory
+    n_taxa -- number of taxa to generate
+    seed -- seed of the random generator, default 0
+    """
+    rand = random.Random(seed)
+    with open(os.path.join(outdir, 'nodes.dmp'), 'w') as nodes, \
+            open(os.path.join(outdir, 'names.dmp'), 'w') as names:
+        for taxid in range(1, n_taxa + 1):
+            parent = 1 if taxid < 3 else rand.randint(1, taxid - 1)
+            rank = 'no rank' if taxid == 1 else rand.choice(RANKS)
+            name = 'root' if taxid == 1 else 'taxon %d' % taxid
+            nodes.write('%d\t|\t%d\t|\t%s\t|\t\t|\n' % (taxid, parent, rank))
+            names.write('%d\t|\t%s\t|\t\t|\tscientific name\t|\n' % (
+                taxid, name))
+
+
+def accessions(division, n_accessions):
+    """Return the list of accession numbers generated for a division
+
+    Arguments:
+    division -- one of est, gb, gss, wgs or prot
+    n_accessions -- number of accessions
+    """
+    prefixes = PREFIXES[division]
+    return ['%s%08d' % (prefixes[i % len(prefixes)], i)
+            for i in range(n_accessions)]
+
+
+def accession2taxid(outdir, division, n_accessions, n_taxa, seed=0):
+    """Write a synthetic gzipped accession2taxid file in outdir
+
+    Arguments:
+    outdir -- output directory
+    division -- one of est, gb, gss, wgs or prot
+    n_accessions -- number of accessions to generate
+    n_taxa -- number of taxa in the matching taxdump
+    seed -- seed of the random generator, default 0
+    """
+    rand = random.Random(seed)
+    path = os.path.join(outdir, ACC_FILES[division])
+    with gzip.open(path, 'wt') as f:
+        f.write('accession\taccession.version\ttaxid\tgi\n')
+        for gi, acc in enumerate(accessions(division, n_accessions)):
+            f.write('%s\t%s.1\t%d\t%d\n' % (
+                acc, acc, rand.randint(2, n_taxa), gi))
+    return path
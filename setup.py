@@ -19,6 +19,10 @@ setup(
     packages=find_packages(exclude=['tests']),
 
     install_requires=['ftputil', 'peewee==2.8.1', 'PyMySQL', 'nose', 'psycopg2'],
+    extras_require={
+        'parquet': ['pyarrow'],
+        'numpy': ['numpy'],
+    },
 
     entry_points={
         'console_scripts': ['taxadb = taxadb.app:main'],
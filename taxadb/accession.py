@@ -2,123 +2,411 @@
 # -*- coding: utf-8 -*-
 
 from taxadb.schema import *
+from taxadb import metrics
+from taxadb import util
+from taxadb import bloom
+from taxadb import shard
+import itertools
+import sqlite3
 import sys
 
+# number of accession numbers per query, lowered on SQLite to the number of
+# variables it accepts per query (see _chunk)
+CHUNK = 10000
 
-def taxid(acc_number_list, db_name, table, **kwargs):
+# variable limit of SQLite before 3.32, when the limit cannot be read
+SQLITE_MAX_VARIABLES = 999
+
+
+def taxid(acc_number_list, db_name, table=None, fetch_size=FETCH_SIZE,
+          **kwargs):
     """given a list of accession numbers, yield
     the accession number and their associated taxids as tuples
 
     Arguments:
     acc_number_list -- a list of accession numbers
     db_name -- the path to the database to query
-    table -- the table containing the accession numbers
+    table -- the table containing the accession numbers. If None, each
+        accession number is looked up in the table(s) where its prefix was
+        found when the database was built
+    fetch_size -- number of rows fetched from the database at a time
     kwargs -- Extra options for non sqlite database type (e.g.: --username/--password)
     """
     database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
     db.initialize(database)
     db.connect()
-    _check_table_exists(table)
     with db.atomic():
-        query = table.select().where(table.accession << acc_number_list)
-        for i in query:
-            try:
-                yield (i.accession, i.taxid.ncbi_taxid)
-            except Taxa.DoesNotExist:
-                _unmapped_taxid(i.accession)
+        for acc, ncbi_taxid, name, parent in _select(
+                table, acc_number_list, db_name, 'accession.taxid',
+                fetch_size, **kwargs):
+            if ncbi_taxid is None:
+                _unmapped_taxid(acc)
+                continue
+            yield (acc, ncbi_taxid)
     db.close()
 
 
-def sci_name(acc_number_list, db_name, table, **kwargs):
+def sci_name(acc_number_list, db_name, table=None, fetch_size=FETCH_SIZE,
+             **kwargs):
     """given a list of acession numbers, yield
     the accession number and their associated scientific name as tuples
 
     Arguments:
     acc_number_list -- a list of accession numbers
     db_name -- the path to the database to query
-    table -- the table containing the accession numbers
+    table -- the table containing the accession numbers. If None, each
+        accession number is looked up in the table(s) where its prefix was
+        found when the database was built
+    fetch_size -- number of rows fetched from the database at a time
     kwargs -- Extra options for non sqlite database type (e.g.: --username/--password)
     """
     database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
     db.initialize(database)
     db.connect()
-    _check_table_exists(table)
     with db.atomic():
-        query = table.select().where(table.accession << acc_number_list)
-        for i in query:
-            try:
-                yield (i.accession, i.taxid.tax_name)
-            except Taxa.DoesNotExist:
-                _unmapped_taxid(i.accession)
+        for acc, ncbi_taxid, name, parent in _select(
+                table, acc_number_list, db_name, 'accession.sci_name',
+                fetch_size, **kwargs):
+            if ncbi_taxid is None:
+                _unmapped_taxid(acc)
+                continue
+            yield (acc, name)
     db.close()
 
 
-def lineage_id(acc_number_list, db_name, table, **kwargs):
+def lineage_id(acc_number_list, db_name, table=None, fetch_size=FETCH_SIZE,
+               **kwargs):
     """given a list of acession numbers, yield the accession number and their
     associated lineage (in the form of taxids) as tuples
 
     Arguments:
     acc_number_list -- a list of accession numbers
     db_name -- the path to the database to query
-    table -- the table containing the accession numbers
+    table -- the table containing the accession numbers. If None, each
+        accession number is looked up in the table(s) where its prefix was
+        found when the database was built
+    fetch_size -- number of rows fetched from the database at a time
     kwargs -- Extra options for non sqlite database type (e.g.: --username/--password)
     """
     database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
     db.initialize(database)
     db.connect()
-    _check_table_exists(table)
     with db.atomic():
-        query = table.select().where(table.accession << acc_number_list)
-        for i in query:
-            try:
-                lineage_list = []
-                current_lineage = i.taxid.tax_name
-                current_lineage_id = i.taxid.ncbi_taxid
-                parent = i.taxid.parent_taxid
-                while current_lineage != 'root':
-                    lineage_list.append(current_lineage_id)
-                    new_query = Taxa.get(Taxa.ncbi_taxid == parent)
-                    current_lineage = new_query.tax_name
-                    current_lineage_id = new_query.ncbi_taxid
-                    parent = new_query.parent_taxid
-                yield (i.accession, lineage_list)
-            except Taxa.DoesNotExist:
-                _unmapped_taxid(i.accession)
+        for acc, lineage, nodes in _lineages(
+                table, acc_number_list, db_name, 'accession.lineage_id',
+                fetch_size, **kwargs):
+            yield (acc, list(lineage))
     db.close()
 
 
-def lineage_name(acc_number_list, db_name, table, **kwargs):
+def lineage_name(acc_number_list, db_name, table=None, fetch_size=FETCH_SIZE,
+                 **kwargs):
     """given a list of acession numbers, yield the accession number and their
     associated lineage as tuples
 
     Arguments:
     acc_number_list -- a list of accession numbers
     db_name -- the path to the database to query
-    table -- the table containing the accession numbers
+    table -- the table containing the accession numbers. If None, each
+        accession number is looked up in the table(s) where its prefix was
+        found when the database was built
+    fetch_size -- number of rows fetched from the database at a time
     kwargs -- Extra options for non sqlite database type (e.g.: --username/--password)
     """
     database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
     db.initialize(database)
     db.connect()
-    _check_table_exists(table)
     with db.atomic():
-        query = table.select().where(table.accession << acc_number_list)
-        for i in query:
-            try:
-                lineage_list = []
-                current_lineage = i.taxid.tax_name
-                parent = i.taxid.parent_taxid
-                while current_lineage != 'root':
-                    lineage_list.append(current_lineage)
-                    new_query = Taxa.get(Taxa.ncbi_taxid == parent)
-                    current_lineage = new_query.tax_name
-                    parent = new_query.parent_taxid
-                yield (i.accession, lineage_list)
-            except Taxa.DoesNotExist:
-                _unmapped_taxid(i.accession)
+        for acc, lineage, nodes in _lineages(
+                table, acc_number_list, db_name, 'accession.lineage_name',
+                fetch_size, **kwargs):
+            yield (acc, [nodes[t][0] for t in lineage])
     db.close()
 
 
+def _lineages(table, acc_number_list, db_name, name, fetch_size,
+              nodes=None, lineages=None, **kwargs):
+    """Yield (accession, lineage, nodes) tuples, the lineage being a tuple of
+    taxids and nodes a dict mapping each taxid to its (scientific name,
+    parent taxid). Rows are read CHUNK at a time, and the lineage of each
+    distinct taxid is resolved once for the whole call, however many
+    accession numbers map to it, or across calls if they share nodes and
+    lineages.
+
+    Arguments:
+    table -- the table containing the accession numbers, or None
+    acc_number_list -- a list of accession numbers
+    db_name -- the path to the database to query
+    name -- name of the latency metric recorded for each query
+    fetch_size -- number of rows fetched from the database at a time
+    nodes -- optional dict of the taxa already read (see _fetch_ancestors)
+    lineages -- optional dict of the lineages already resolved (see _lineage)
+    kwargs -- Extra options to open the shards of a table (see _select)
+    """
+    if nodes is None:
+        nodes = {}
+    if lineages is None:
+        lineages = {}
+    rows = _select(table, acc_number_list, db_name, name, fetch_size,
+                   buffered=True, **kwargs)
+    while True:
+        batch = list(itertools.islice(rows, CHUNK))
+        if not batch:
+            break
+        taxids = set()
+        for acc, ncbi_taxid, tax_name, parent in batch:
+            if ncbi_taxid is not None:
+                nodes[ncbi_taxid] = (tax_name, parent)
+                taxids.add(ncbi_taxid)
+        _fetch_ancestors(taxids, nodes, fetch_size)
+        for acc, ncbi_taxid, tax_name, parent in batch:
+            lineage = None
+            if ncbi_taxid is not None:
+                lineage = _lineage(ncbi_taxid, nodes, lineages)
+            if lineage is None:
+                _unmapped_taxid(acc)
+                continue
+            yield (acc, lineage, nodes)
+
+
+def _fetch_ancestors(taxids, nodes, fetch_size):
+    """Add the ancestors of taxids to nodes, querying Taxa once per level of
+    the tree for all the parents which are not in nodes yet
+
+    Arguments:
+    taxids -- taxids, which are in nodes
+    nodes -- dict mapping a taxid to its (scientific name, parent taxid)
+    fetch_size -- number of rows fetched from the database at a time
+    """
+    pending = taxids
+    while pending:
+        parents = set()
+        for taxid in pending:
+            tax_name, parent = nodes[taxid]
+            if tax_name != 'root' and parent not in nodes:
+                parents.add(parent)
+        parents = list(parents)
+        pending = set()
+        chunk = _chunk()
+        for i in range(0, len(parents), chunk):
+            query = Taxa.select(
+                Taxa.ncbi_taxid, Taxa.tax_name, Taxa.parent_taxid).where(
+                Taxa.ncbi_taxid << parents[i:i + chunk])
+            metrics.count('accession.queries')
+            for taxid, tax_name, parent in list(stream(query, fetch_size)):
+                nodes[taxid] = (tax_name, parent)
+                pending.add(taxid)
+
+
+def _lineage(taxid, nodes, lineages):
+    """Return the lineage of a taxon as a tuple of taxids, from the taxon up
+    to (and excluding) the root, or None if one of its ancestors is not in
+    nodes. Lineages are memoized in lineages, so that the walk up the tree
+    stops at the first ancestor whose lineage is already known.
+
+    Arguments:
+    taxid -- a taxid
+    nodes -- dict mapping a taxid to its (scientific name, parent taxid)
+    lineages -- dict mapping a taxid to its lineage
+    """
+    path = []
+    while True:
+        if taxid in lineages:
+            lineage = lineages[taxid]
+            break
+        if taxid not in nodes:
+            lineage = None
+            break
+        tax_name, parent = nodes[taxid]
+        if tax_name == 'root':
+            lineage = ()
+            break
+        path.append(taxid)
+        if parent == taxid:
+            lineage = ()
+            break
+        taxid = parent
+    for taxid in reversed(path):
+        if lineage is not None:
+            lineage = (taxid,) + lineage
+        lineages[taxid] = lineage
+    return lineage
+
+
+def _select(table, acc_number_list, db_name, name, fetch_size=FETCH_SIZE,
+            buffered=False, **kwargs):
+    """Yield (accession, taxid, scientific name, parent taxid) tuples for the
+    given accession numbers, running one query per table the accession
+    numbers are routed to. The sequence table is joined to Taxa, so the taxon
+    columns are None for accessions whose taxid is not in Taxa. Accession
+    numbers rejected by the bloom filter of a table are not queried.
+
+    The accession numbers are queried _chunk() at a time, and the rows are
+    streamed from a server-side cursor (see schema.stream), so that memory
+    does not grow with the number of accession numbers. If the caller
+    queries the database while reading the rows, set buffered: each result
+    is then read before its rows are yielded, since a MySQL connection
+    cannot run a query while a server-side cursor is open.
+
+    Tables sharded over sqlite files are looked up in all their shards in
+    parallel (see _select_shards), and the taxa of the rows found are then
+    read from Taxa.
+
+    Arguments:
+    table -- the table containing the accession numbers, or None
+    acc_number_list -- a list of accession numbers
+    db_name -- the path to the database to query
+    name -- name of the latency metric recorded for each query
+    fetch_size -- number of rows fetched from the database at a time
+    buffered -- read each result before yielding its rows
+    kwargs -- Extra options to open the shards of a table (e.g.: dbtype/readonly)
+    """
+    for table, accessions in _route(table, acc_number_list):
+        accessions = _filter(db_name, table, accessions, **kwargs)
+        shards = shard.count(table)
+        chunk = _chunk()
+        if shards:
+            for row in _select_shards(table, shards, accessions, db_name,
+                                      name, chunk, fetch_size, **kwargs):
+                yield row
+            continue
+        for i in range(0, len(accessions), chunk):
+            query = table.select(
+                table.accession, Taxa.ncbi_taxid, Taxa.tax_name,
+                Taxa.parent_taxid).join(Taxa, pw.JOIN.LEFT_OUTER).where(
+                table.accession << accessions[i:i + chunk])
+            metrics.count('accession.queries')
+            with metrics.timer(name, 'latency'):
+                rows = stream(query, fetch_size)
+                if buffered:
+                    rows = list(rows)
+            for row in rows:
+                yield row
+
+
+def _select_shards(table, n, acc_number_list, db_name, name, chunk,
+                   fetch_size, **kwargs):
+    """Yield the rows of _select for a table sharded over sqlite files. The
+    accession numbers are split by shard, and each shard is looked up in
+    chunks, all shards in parallel, on connections opened once for the whole
+    call (see shard.Reader).
+
+    Arguments:
+    table -- the sequence table
+    n -- number of shards
+    acc_number_list -- a list of accession numbers
+    db_name -- the path to the database to query
+    name -- name of the latency metric recorded for each query
+    chunk -- the maximum number of accession numbers per query
+    fetch_size -- number of rows fetched from the database at a time
+    kwargs -- Extra options to open the shards (e.g.: dbtype/readonly)
+    """
+    reader = shard.Reader(table, n, db_name, **kwargs)
+    try:
+        for batch in reader.batches(acc_number_list, chunk):
+            metrics.count('accession.queries', len(batch))
+            with metrics.timer(name, 'latency'):
+                rows = _join_taxa(reader.lookup(batch), fetch_size)
+            for row in rows:
+                yield row
+    finally:
+        reader.close()
+
+
+def _join_taxa(found, fetch_size):
+    """Return the (accession, taxid, scientific name, parent taxid) tuples of
+    (accession, taxid) tuples, like the join of _select: the taxon columns
+    are None if the taxid is not in Taxa
+
+    Arguments:
+    found -- a list of (accession, taxid) tuples
+    fetch_size -- number of rows fetched from the database at a time
+    """
+    taxids = list({taxid for acc, taxid in found})
+    taxa = {}
+    chunk = _chunk()
+    for i in range(0, len(taxids), chunk):
+        query = Taxa.select(
+            Taxa.ncbi_taxid, Taxa.tax_name, Taxa.parent_taxid).where(
+            Taxa.ncbi_taxid << taxids[i:i + chunk])
+        metrics.count('accession.queries')
+        for taxid, tax_name, parent in stream(query, fetch_size):
+            taxa[taxid] = (taxid, tax_name, parent)
+    return [(acc,) + taxa.get(taxid, (None, None, None))
+            for acc, taxid in found]
+
+
+def _chunk():
+    """Return the number of values bound per query on the connected
+    database: CHUNK, or the variable limit of SQLite if it is lower"""
+    if not isinstance(db.obj, pw.SqliteDatabase):
+        return CHUNK
+    limit = SQLITE_MAX_VARIABLES
+    conn = db.get_conn()
+    if hasattr(conn, 'getlimit'):  # python >= 3.11
+        limit = conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    return min(CHUNK, limit)
+
+
+def _filter(db_name, table, acc_number_list, **kwargs):
+    """Drop the accession numbers a table definitely does not contain,
+    according to its bloom filter (if one was built)
+
+    Arguments:
+    db_name -- the path to the database to query
+    table -- the table containing the accession numbers
+    acc_number_list -- a list of accession numbers
+    kwargs -- the options of the database (dbtype/hostname/port)
+    """
+    bloom_filter = bloom.get(db_name, table._meta.db_table, **kwargs)
+    if bloom_filter is None:
+        return acc_number_list
+    accessions = [acc for acc in acc_number_list if acc in bloom_filter]
+    metrics.count('accession.bloom_rejected',
+                  len(acc_number_list) - len(accessions))
+    return accessions
+
+
+def _route(table, acc_number_list):
+    """Group accession numbers by the sequence table(s) that can contain them.
+
+    If table is given, all the accession numbers go to it. Otherwise, the
+    AccessionPrefix table built by 'taxadb create' maps the prefix of each
+    accession number to the tables it was found in; accession numbers whose
+    prefix is in no table are dropped. Databases built without it fall back
+    to querying every sequence table.
+
+    Arguments:
+    table -- the table containing the accession numbers, or None
+    acc_number_list -- a list of accession numbers
+    Yields (table, accession numbers) tuples
+    """
+    if table is not None:
+        _check_table_exists(table)
+        yield (table, acc_number_list)
+        return
+    tables = [t for t in SEQUENCE_TABLES if t.table_exists()]
+    if not AccessionPrefix.table_exists():
+        for table in tables:
+            yield (table, acc_number_list)
+        return
+    prefixes = {}
+    for acc in acc_number_list:
+        prefixes.setdefault(util.accession_prefix(acc), []).append(acc)
+    routes = {}
+    keys = list(prefixes)
+    chunk = _chunk()
+    for i in range(0, len(keys), chunk):
+        query = AccessionPrefix.select(
+            AccessionPrefix.prefix, AccessionPrefix.division).where(
+            AccessionPrefix.prefix << keys[i:i + chunk])
+        for prefix, division in stream(query):
+            routes.setdefault(division, []).extend(prefixes[prefix])
+    for table in tables:
+        if table._meta.db_table in routes:
+            yield (table, routes[table._meta.db_table])
+
+
 def _check_table_exists(table):
     """Check a table exists in the database
 
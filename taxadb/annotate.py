@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+import tempfile
+
+from taxadb.schema import *
+from taxadb import accession
+
+# accession functions which can annotate a file
+FIELDS = ['taxid', 'sci_name', 'lineage_id', 'lineage_name']
+
+# value written for accessions which are not in the database
+MISSING = 'NA'
+
+# number of lines looked up at a time by a worker
+BATCH_SIZE = 100000
+
+# the database connection and lineage memo of a worker process, see
+# _init_worker
+_worker = {}
+
+
+def shards(input_file, n):
+    """Split a file in at most n byte ranges, each starting at the beginning
+    of a line
+
+    Arguments:
+    input_file -- the file to split
+    n -- number of shards
+    Returns a list of (start, end) offsets
+    """
+    size = os.path.getsize(input_file)
+    boundaries = [0]
+    with open(input_file, 'rb') as f:
+        for i in range(1, n):
+            f.seek(max(size * i // n - 1, boundaries[-1]))
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:])
+            if end > start]
+
+
+def annotate(input_file, output_file, db_name, table=None, field='sci_name',
+             column=2, sep='\t', processes=None, ordered=True,
+             strip_version=True, batch_size=BATCH_SIZE, **kwargs):
+    """Annotate a tabular file (e.g. a BLAST or DIAMOND output) with the
+    taxonomic information of the accession number found in one of its
+    columns. The file is split in byte range shards, annotated in parallel by
+    a pool of processes. Each process connects to the database once, and
+    resolves the lineage of each taxon once, for all the shards it annotates.
+
+    Arguments:
+    input_file -- the file to annotate
+    output_file -- the annotated file, each line of input_file followed by
+        the annotation (MISSING for accessions not in the database)
+    db_name -- the path to the database to query
+    table -- the table containing the accession numbers, or None to route
+        each accession by its prefix
+    field -- the accession function used to annotate: taxid, sci_name,
+        lineage_id or lineage_name. Lineages are joined with ';'
+    column -- the column (1-based) holding the accession numbers, default 2
+    sep -- the column separator, default tab
+    processes -- number of worker processes, default the number of cores
+    ordered -- write the annotated lines in the order of input_file. If
+        False, shards are written as soon as they are annotated
+    strip_version -- remove the version (.1) of accession numbers
+    batch_size -- number of lines looked up at a time, which bounds the
+        memory of the workers, default BATCH_SIZE
+    kwargs -- Extra options for the database (e.g.: dbtype/readonly)
+    Returns the number of annotated lines
+    Throws `SystemExit` if the database or the table cannot be opened
+    """
+    import multiprocessing
+
+    _check_database(db_name, table, kwargs)
+    processes = processes or os.cpu_count() or 1
+    tmpdir = tempfile.mkdtemp(
+        dir=os.path.dirname(os.path.abspath(output_file)))
+    jobs = []
+    for i, (start, end) in enumerate(shards(input_file, processes * 4)):
+        jobs.append((input_file, start, end, os.path.join(tmpdir, str(i)),
+                     db_name, table, field, column, sep, strip_version,
+                     batch_size, kwargs))
+    lines = 0
+    try:
+        with multiprocessing.Pool(processes, _init_worker,
+                                  (db_name, kwargs)) as pool, \
+                open(output_file, 'wb') as out:
+            imap = pool.imap if ordered else pool.imap_unordered
+            for shard_file, shard_lines in imap(_annotate_shard, jobs):
+                with open(shard_file, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+                os.remove(shard_file)
+                lines += shard_lines
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return lines
+
+
+def _check_database(db_name, table, kwargs):
+    """Open the database and check the table in the parent process, so that
+    the errors which exit (missing database, dbtype, credentials or table)
+    happen before the pool is started"""
+    if kwargs.get('dbtype') == 'sqlite' and not os.path.exists(db_name):
+        print('[ERROR] %s does not exist' % db_name, file=sys.stderr)
+        sys.exit(1)
+    database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
+    db.initialize(database)
+    db.connect()
+    try:
+        if table is not None:
+            accession._check_table_exists(table)
+    finally:
+        db.close()
+
+
+def _init_worker(db_name, kwargs):
+    """Connect a worker process to the database, and start the memo of the
+    lineages it resolves. The connection lasts as long as the process."""
+    database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
+    db.initialize(database)
+    db.connect()
+    _worker['nodes'] = {}
+    _worker['lineages'] = {}
+
+
+def _annotate_shard(job):
+    """Annotate the lines of a shard of the input file, in a worker process
+
+    Arguments:
+    job -- tuple of the arguments of annotate, and of the shard offsets and
+        output file
+    Returns the shard output file and its number of lines
+    """
+    try:
+        return _annotate_lines(job)
+    except Exception:
+        raise
+    except BaseException as e:
+        # a worker which exits loses its task, and the pool then waits for
+        # it forever: fail the task instead
+        raise Exception('annotation worker exited (%s: %s)' % (
+            type(e).__name__, e))
+
+
+def _annotate_lines(job):
+    """Annotate the lines of a shard, see _annotate_shard"""
+    (input_file, start, end, shard_file, db_name, table, field, column, sep,
+     strip_version, batch_size, kwargs) = job
+    sep = sep.encode()
+    lines = 0
+    with open(input_file, 'rb') as f, open(shard_file, 'wb') as out:
+        f.seek(start)
+        position = start
+        batch = []
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            batch.append(line.rstrip(b'\r\n'))
+            if len(batch) == batch_size:
+                _write_batch(batch, out, field, db_name, table, column, sep,
+                             strip_version, kwargs)
+                lines += len(batch)
+                batch = []
+        if batch:
+            _write_batch(batch, out, field, db_name, table, column, sep,
+                         strip_version, kwargs)
+            lines += len(batch)
+    return shard_file, lines
+
+
+def _write_batch(batch, out, field, db_name, table, column, sep,
+                 strip_version, kwargs):
+    """Look up the accessions of a batch of lines, write the annotated lines"""
+    accessions = []
+    for line in batch:
+        fields = line.split(sep)
+        acc = fields[column - 1].decode() if len(fields) >= column else ''
+        if strip_version:
+            acc = acc.rsplit('.', 1)[0]
+        accessions.append(acc)
+    found = {}
+    values = {}  # one copy of each annotation, shared by its accessions
+    for acc, value in _lookup(field, list(set(accessions)), db_name, table,
+                              kwargs):
+        if isinstance(value, list):
+            value = ';'.join(str(v) for v in value)
+        value = str(value).encode()
+        found[acc] = values.setdefault(value, value)
+    missing = MISSING.encode()
+    for line, acc in zip(batch, accessions):
+        out.write(line + sep + found.get(acc, missing) + b'\n')
+
+
+def _lookup(field, acc_number_list, db_name, table, kwargs):
+    """Yield the (accession, value) tuples of an accession function, on the
+    connection and with the lineage memo of the worker (see _init_worker)
+
+    Arguments:
+    field -- the accession function: taxid, sci_name, lineage_id or
+        lineage_name
+    acc_number_list -- a list of distinct accession numbers
+    db_name -- the path to the database to query
+    table -- the table containing the accession numbers, or None
+    kwargs -- Extra options for the database (e.g.: dbtype/readonly)
+    """
+    name = 'accession.%s' % field
+    with db.atomic():
+        if field in ['taxid', 'sci_name']:
+            for acc, taxid, tax_name, parent in accession._select(
+                    table, acc_number_list, db_name, name, **kwargs):
+                if taxid is None:
+                    accession._unmapped_taxid(acc)
+                    continue
+                yield (acc, taxid if field == 'taxid' else tax_name)
+            return
+        for acc, lineage, nodes in accession._lineages(
+                table, acc_number_list, db_name, name, FETCH_SIZE,
+                nodes=_worker['nodes'], lineages=_worker['lineages'],
+                **kwargs):
+            if field == 'lineage_id':
+                yield (acc, list(lineage))
+            else:
+                yield (acc, [nodes[t][0] for t in lineage])
@@ -2,15 +2,17 @@
 # -*- coding: utf-8 -*-
 
 import os
-import tarfile
-import ftputil
+import sys
 import argparse
 
 from taxadb import util
-from taxadb import parse
+from taxadb import metrics
 
 from taxadb.schema import *
 
+# the other taxadb modules are imported by the functions of the sub-commands
+# which need them, so that each sub-command only pays for its own imports
+
 
 def download(args):
     """Main function for the 'taxadb download' sub-command. This function
@@ -20,7 +22,13 @@ def download(args):
     Arguments:
     args -- parser from the argparse library. contains:
     args.outdir -- output directory
+    args.extract -- also extract taxdump.tar.gz. 'taxadb create' reads the
+        archive directly, so this is only needed to use the .dmp files
     """
+    # only needed to download, not imported by the other sub-commands
+    import ftputil
+    import tarfile
+
     ncbi_ftp = 'ftp.ncbi.nlm.nih.gov'
 
     # files to download in accession2taxid
@@ -50,10 +58,11 @@ def download(args):
         ncbi.download_if_newer(taxdump, taxdump)
         ncbi.download_if_newer(taxdump + '.md5', taxdump + '.md5')
         util.md5_check(taxdump)
-    print('Unpacking %s' % (taxdump))
-    with tarfile.open(taxdump, "r:gz") as tar:
-        tar.extractall()
-        tar.close()
+    if getattr(args, 'extract', False):
+        print('Unpacking %s' % (taxdump))
+        with tarfile.open(taxdump, "r:gz") as tar:
+            tar.extractall()
+            tar.close()
 
 
 def create_db(args):
@@ -64,15 +73,54 @@ def create_db(args):
     args -- parser from the argparse library. contains:
     args.input -- input directory. It is the directory created by
         'taxadb download'
+    args.from_parquet -- directory created by 'taxadb export', to build the
+        database from instead of args.input
+    args.url -- base url of the ncbi taxonomy (e.g.:
+        ftp://ftp.ncbi.nlm.nih.gov/pub/taxonomy), to build the database from
+        while downloading it, instead of args.input
+    args.pipeline -- overlap reading, decompressing, parsing and inserting
+        the accession2taxid files of args.input (always on with args.url)
     args.dbname -- name of the database to be created
     args.dbtype -- type of database to be used. Currently only sqlite is
         supported
     args.division -- division to create the db for. Full will build all the
         tables, prot will only build the prot table, nucl will build gb, wgs,
         gss and est
+    args.bloom -- build a bloom filter of the accessions of each sequence
+        table, used by the accession functions to skip definite misses
+    args.bloom_error_rate -- target false positive rate of the filters
+    args.include_taxa -- optional list of taxids: only build the clades
+        rooted at them (and their ancestors in Taxa)
+    args.exclude_taxa -- optional list of taxids whose clades are left out
+    args.shards -- spread each sequence table over this number of shards:
+        hash partitions on postgres, separate files on sqlite
+    args.metrics -- optional file where to write build metrics
+    args.metrics_format -- format of the metrics file, json or prometheus
     """
+    collector = None
+    if getattr(args, 'metrics', None):
+        collector = metrics.add_hook(metrics.Collector())
+    try:
+        _create_db(args)
+    finally:
+        if collector is not None:
+            metrics.remove_hook(collector)
+            collector.write(args.metrics, args.metrics_format)
+
+
+def _create_db(args):
+    """Build the database, see create_db"""
+    from taxadb import bloom
+    from taxadb import columnar
+    from taxadb import shard
+
     database = DatabaseFactory(**args.__dict__).get_database()
     div = args.division  # am lazy at typing
+    from_parquet = getattr(args, 'from_parquet', None)
+    include = getattr(args, 'include_taxa', None)
+    exclude = getattr(args, 'exclude_taxa', None)
+    members = None  # taxids kept by --include-taxa/--exclude-taxa
+    shards = getattr(args, 'shards', 1) or 1
     db.initialize(database)
 
     nucl_est = 'nucl_est.accession2taxid.gz'
@@ -87,49 +135,403 @@ def create_db(args):
     # If taxa table already exists, do not recreate and fill it
     if not Taxa.table_exists():
         db.create_table(Taxa)
-        taxa_info_list = parse.taxdump(
-            args.input + '/nodes.dmp',
-            args.input + '/names.dmp'
-        )
-        with db.atomic():
-            for i in range(0, len(taxa_info_list), args.chunk):
-                Taxa.insert_many(taxa_info_list[i:i+args.chunk]).execute()
+        if from_parquet:
+            taxa_path = columnar.path(from_parquet, 'taxa')
+            if taxa_path is None:
+                print('[ERROR] no taxa file in %s' % from_parquet, file=sys.stderr)
+                sys.exit(1)
+            taxa_chunks = columnar.read(taxa_path, args.chunk)
+        else:
+            with metrics.timer('create.taxa.parse'):
+                taxa_info_list = _read_taxdump(args)
+            taxa_chunks = (taxa_info_list[i:i+args.chunk]
+                           for i in range(0, len(taxa_info_list), args.chunk))
+        if include or exclude:
+            taxa_info_list = [row for c in taxa_chunks for row in c]
+            members, kept = _clade(
+                args, ((r['ncbi_taxid'], r['parent_taxid'])
+                       for r in taxa_info_list))
+            taxa_info_list = [r for r in taxa_info_list
+                              if int(r['ncbi_taxid']) in kept]
+            taxa_chunks = (taxa_info_list[i:i+args.chunk]
+                           for i in range(0, len(taxa_info_list), args.chunk))
+        taxa_rows = 0
+        with metrics.timer('create.taxa.insert'), db.atomic():
+            for taxa_chunk in taxa_chunks:
+                Taxa.insert_many(taxa_chunk).execute()
+                taxa_rows += len(taxa_chunk)
+        metrics.count('create.taxa.rows', taxa_rows)
         print('Taxa: completed')
+    elif include or exclude:
+        members, kept = _clade(
+            args, stream(Taxa.select(Taxa.ncbi_taxid, Taxa.parent_taxid)))
 
     if div in ['full', 'nucl', 'est']:
-        db.create_table(Est)
         acc_dl_dict[Est] = nucl_est
     if div in ['full', 'nucl', 'gb']:
-        db.create_table(Gb)
         acc_dl_dict[Gb] = nucl_gb
     if div in ['full', 'nucl', 'gss']:
-        db.create_table(Gss)
         acc_dl_dict[Gss] = nucl_gss
     if div in ['full', 'nucl', 'wgs']:
-        db.create_table(Wgs)
         acc_dl_dict[Wgs] = nucl_wgs
     if div in ['full', 'prot']:
-        db.create_table(Prot)
         acc_dl_dict[Prot] = prot
+    if from_parquet:
+        for table in list(acc_dl_dict):
+            acc_dl_dict[table] = columnar.path(from_parquet, table._meta.db_table)
+            if acc_dl_dict[table] is None:
+                print('%s: not exported in %s, skipped' % (table._meta.db_table, from_parquet))
+                del acc_dl_dict[table]
+    for table in acc_dl_dict:
+        if shards > 1:
+            shard.create(table, shards)
+        else:
+            db.create_table(table)
+
+    if not AccessionPrefix.table_exists():
+        db.create_table(AccessionPrefix)
 
     with db.atomic():
         for table, acc_file in acc_dl_dict.items():
+            name = table._meta.db_table
             inserted_rows = 0
-            for data_dict in parse.accession2taxid(args.input + '/' + acc_file, args.chunk):
-                    table.insert_many(data_dict[0:args.chunk]).execute()
+            prefixes = set()
+            writer = None
+            n_shards = shard.count(table)
+            if n_shards:
+                writer = shard.Writer(table, n_shards, args.dbname)
+            with metrics.timer('create.%s.load' % name):
+                if from_parquet:
+                    data_chunks = columnar.read(acc_file, args.chunk)
+                    if members is not None:
+                        data_chunks = ([d for d in c if d['taxid'] in members]
+                                       for c in data_chunks)
+                else:
+                    data_chunks = _read_accession2taxid(args, acc_file, members)
+                for data_dict in data_chunks:
+                    if not data_dict:
+                        continue
+                    with metrics.timer('create.%s.insert' % name):
+                        if writer is not None:
+                            writer.insert(data_dict[0:args.chunk])
+                        else:
+                            table.insert_many(data_dict[0:args.chunk]).execute()
+                    prefixes.update(util.accession_prefix(d['accession']) for d in data_dict)
                     inserted_rows += len(data_dict)
-            print('%s: %s added to database (%d rows inserted)' % (table._meta.db_table, acc_file, inserted_rows))
-            print('%s: creating index for field accession ... ' % table._meta.db_table, end="")
-            db.create_index(table, ['accession'], unique=True)
+            metrics.count('create.%s.rows' % name, inserted_rows)
+            print('%s: %s added to database (%d rows inserted)' % (name, acc_file, inserted_rows))
+            print('%s: creating index for field accession ... ' % name, end="")
+            with metrics.timer('create.%s.index' % name):
+                if writer is not None:
+                    writer.close()
+                else:
+                    db.create_index(table, ['accession'], unique=True)
             print('ok.')
+            bloom_path = bloom.path(args.dbname, name, dbtype=args.dbtype,
+                                    hostname=args.hostname, port=args.port)
+            if getattr(args, 'bloom', False):
+                if writer is not None:
+                    accessions = (acc for acc, taxid in
+                                  shard.rows(table, n_shards, args.dbname))
+                else:
+                    accessions = (acc for (acc,) in
+                                  stream(table.select(table.accession)))
+                with metrics.timer('create.%s.bloom' % name):
+                    _build_bloom(table, accessions, inserted_rows,
+                                 args.bloom_error_rate, bloom_path)
+            elif os.path.exists(bloom_path):
+                os.remove(bloom_path)  # stale filter of a previous build
+            _insert_prefixes(name, prefixes, args.chunk)
+            print('%s: %d accession prefixes routed' % (name, len(prefixes)))
     print('Sequence: completed')
     db.close()
 
 
+def _read_taxdump(args):
+    """Parse the taxdump of 'taxadb create': the nodes.dmp and names.dmp
+    files of args.input if they were extracted, else taxdump.tar.gz from
+    args.input or, streamed while it is downloaded, from args.url"""
+    from taxadb import parse
+    from taxadb import pipeline
+
+    url = getattr(args, 'url', None)
+    if url:
+        stream = pipeline.open_stream(url + '/taxdump.tar.gz')
+        taxa_info_list = parse.taxdump_archive(stream)
+        stream.drain()  # raises if the md5 does not match
+        return taxa_info_list
+    nodes = os.path.join(args.input, 'nodes.dmp')
+    names = os.path.join(args.input, 'names.dmp')
+    if os.path.exists(nodes) and os.path.exists(names):
+        return parse.taxdump(nodes, names)
+    return parse.taxdump_archive(os.path.join(args.input, 'taxdump.tar.gz'))
+
+
+def _read_accession2taxid(args, acc_file, taxids=None):
+    """Parse an accession2taxid file of 'taxadb create', from args.url or
+    args.input, in a pipeline of threads if requested, keeping the rows of
+    taxids if given"""
+    from taxadb import parse
+    from taxadb import pipeline
+
+    url = getattr(args, 'url', None)
+    if url:
+        lines = pipeline.lines(url + '/accession2taxid/' + acc_file)
+        return parse.accession2taxid(lines, args.chunk, taxids)
+    path = os.path.join(args.input, acc_file)
+    if getattr(args, 'pipeline', False):
+        return parse.accession2taxid(pipeline.lines(path), args.chunk, taxids)
+    return parse.accession2taxid(path, args.chunk, taxids)
+
+
+def _clade(args, nodes):
+    """Compute the taxa selected by args.include_taxa and args.exclude_taxa
+
+    Arguments:
+    args -- the arguments of 'taxadb create'
+    nodes -- iterable of (taxid, parent taxid) of every taxon
+    Returns the set of the selected taxids, and the set of the taxids kept
+    in Taxa (the selected ones and their ancestors)
+    Throws `SystemExit` if an included taxid is not in the taxonomy
+    """
+    from taxadb import parse
+
+    include = args.include_taxa or []
+    members, ancestors = parse.clade(nodes, include, args.exclude_taxa or [])
+    missing = [str(t) for t in include
+               if t not in members and t not in (args.exclude_taxa or [])]
+    if missing:
+        print('[ERROR] taxid(s) %s not in the taxonomy' % ', '.join(missing),
+              file=sys.stderr)
+        sys.exit(1)
+    print('Clades: %d taxa selected' % len(members))
+    return members, members | ancestors
+
+
+def _taxid_list(value):
+    """argparse type of a comma separated list of taxids"""
+    try:
+        return [int(t) for t in value.split(',') if t.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError('not a list of taxids: %s' % value)
+
+
+def _build_bloom(table, accessions, capacity, error_rate, bloom_path):
+    """Build and save the bloom filter of the accessions of a sequence table
+
+    Arguments:
+    table -- the sequence table
+    accessions -- iterable of the accessions of the table
+    capacity -- number of accessions in the table
+    error_rate -- target false positive rate
+    bloom_path -- output file
+    """
+    from taxadb import bloom
+
+    print('%s: building bloom filter ... ' % table._meta.db_table, end="")
+    bloom_filter = bloom.BloomFilter(capacity, error_rate)
+    for acc in accessions:
+        bloom_filter.add(acc)
+    bloom_filter.save(bloom_path)
+    print('ok (%d accessions, %.1f MiB, false positive rate %.4f).' % (
+        len(bloom_filter), len(bloom_filter.bits) / 2 ** 20,
+        bloom_filter.false_positive_rate()))
+
+
+def _insert_prefixes(division, prefixes, chunk):
+    """Record which accession prefixes a sequence table contains, replacing
+    the prefixes previously recorded for it
+
+    Arguments:
+    division -- name of the sequence table
+    prefixes -- set of accession prefixes found in the table
+    chunk -- number of rows to insert in bulk
+    """
+    AccessionPrefix.delete().where(
+        AccessionPrefix.division == division).execute()
+    rows = [{'prefix': p, 'division': division} for p in sorted(prefixes)]
+    for i in range(0, len(rows), chunk):
+        AccessionPrefix.insert_many(rows[i:i+chunk]).execute()
+
+
+def export(args):
+    """Main function for the 'taxadb export' sub-command. This function
+    exports the database to columnar files, which 'taxadb create
+    --from-parquet' can load back.
+
+    Arguments:
+    args -- parser from the argparse library. contains:
+    args.outdir -- output directory
+    args.format -- parquet or arrow
+    args.batch_size -- number of rows per record batch
+    args.dbname -- name of the database to export
+    args.dbtype -- type of the database
+    """
+    from taxadb import columnar
+
+    database = DatabaseFactory(**args.__dict__).get_database()
+    db.initialize(database)
+    db.connect()
+    columnar.export(args.outdir, args.format, args.batch_size, args.dbname)
+    db.close()
+
+
+def annotate_file(args):
+    """Main function for the 'taxadb annotate' sub-command. This function
+    annotates a tabular file with the taxonomic information of the accession
+    numbers found in one of its columns, using several processes.
+
+    Arguments:
+    args -- parser from the argparse library. contains:
+    args.input -- file to annotate
+    args.output -- annotated file
+    args.field -- taxid, sci_name, lineage_id or lineage_name
+    args.column -- column holding the accession numbers (1-based)
+    args.table -- sequence table of the accession numbers, or None
+    args.processes -- number of worker processes
+    args.unordered -- do not keep the order of the input lines
+    """
+    from taxadb import annotate
+
+    kwargs = dict(args.__dict__)
+    for key in ['input', 'output', 'field', 'column', 'table', 'processes',
+                'unordered', 'keep_version', 'batch_size', 'func', 'dbname']:
+        kwargs.pop(key, None)
+    tables = {t._meta.db_table: t for t in SEQUENCE_TABLES}
+    lines = annotate.annotate(
+        args.input, args.output, args.dbname,
+        table=tables.get(args.table), field=args.field, column=args.column,
+        processes=args.processes, ordered=not args.unordered,
+        strip_version=not args.keep_version, batch_size=args.batch_size,
+        **kwargs)
+    print('%d lines annotated' % lines)
+
+
+def rollup_counts(args):
+    """Main function for the 'taxadb rollup' sub-command. This function adds
+    the counts of a table of taxa (e.g. reads per taxid, one column per
+    sample) up the taxonomy, to the clade of each of their ancestors.
+
+    Arguments:
+    args -- parser from the argparse library. contains:
+    args.input -- tab separated table of counts, taxids in the first column
+    args.output -- table of clade counts
+    args.ranks -- optional list of ranks of the clades to write
+    """
+    from taxadb import rollup
+
+    kwargs = dict(args.__dict__)
+    for key in ['input', 'output', 'ranks', 'func', 'dbname']:
+        kwargs.pop(key, None)
+    clades = rollup.rollup_file(args.input, args.output, args.dbname,
+                                args.ranks, **kwargs)
+    print('%d clades written' % clades)
+
+
+def make_snapshot(args):
+    """Main function for the 'taxadb snapshot' sub-command. This function
+    saves the taxonomy of the database, and the taxids of a list of frequently
+    queried accession numbers, to a directory of arrays which short-lived
+    processes load with mmap instead of querying the database.
+
+    Arguments:
+    args -- parser from the argparse library. contains:
+    args.outdir -- the snapshot directory, default <dbname>.snapshot
+    args.hot_accessions -- optional file of accession numbers, one per line
+    args.table -- the table of the hot accession numbers
+    """
+    from taxadb import arrays
+    from taxadb import snapshot
+
+    kwargs = dict(args.__dict__)
+    for key in ['outdir', 'hot_accessions', 'table', 'func', 'dbname']:
+        kwargs.pop(key, None)
+    accessions = []
+    if args.hot_accessions:
+        with open(args.hot_accessions) as f:
+            accessions = [line.strip() for line in f if line.strip()]
+    tables = {t._meta.db_table: t for t in SEQUENCE_TABLES}
+    outdir = args.outdir or snapshot.path(args.dbname, **kwargs)
+    cached = arrays.save_snapshot(args.dbname, outdir, accessions,
+                                  tables.get(args.table), **kwargs)
+    print('snapshot written to %s (%d hot accessions)' % (outdir, cached))
+
+
 def query(args):
     print('This has not been implemented yet. Sorry :-(')
 
 
+def _add_database_arguments(parser, readonly=False):
+    """Add the options selecting and connecting to the database to a
+    sub-command parser
+
+    Arguments:
+    parser -- the sub-command parser
+    readonly -- add the options of the read-only sqlite profile, for
+        sub-commands which only read the database
+    """
+    parser.add_argument(
+        '--dbname',
+        '-n',
+        default='taxadb',
+        metavar='taxadb',
+        help='name of the database (default: %(default)s))'
+    )
+    parser.add_argument(
+        '--dbtype',
+        '-t',
+        choices=['sqlite', 'mysql', 'postgres'],
+        default='sqlite',
+        metavar='[sqlite|mysql|postgres]',
+        help='type of the database (default: %(default)s))'
+    )
+    parser.add_argument(
+        '--hostname',
+        '-H',
+        default='localhost',
+        action="store",
+        help='Database connection host (Optional, for MySQLdatabase and PostgreSQLdatabase) (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--password',
+        '-p',
+        default=None,
+        help='Password to use (required for MySQLdatabase and PostgreSQLdatabase)'
+    )
+    parser.add_argument(
+        '--port',
+        '-P',
+        help='Database connection port (default: 5432 (postgres), 3306 (MySQL))'
+    )
+    parser.add_argument(
+        '--username',
+        '-u',
+        default=None,
+        help='Username to login as (required for MySQLdatabase and PostgreSQLdatabase)'
+    )
+    if not readonly:
+        return
+    parser.add_argument(
+        '--readonly',
+        action='store_true',
+        help='Open a sqlite database read-only, memory mapped, for many concurrent readers'
+    )
+    parser.add_argument(
+        '--mmap-size',
+        metavar='<bytes>',
+        type=int,
+        default=1 << 34,
+        help='Size of the sqlite memory map with --readonly (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--cache-size',
+        metavar='<KiB>',
+        type=int,
+        default=65536,
+        help='Size of the sqlite page cache with --readonly (default: %(default)s)'
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(
         prog='taxadb',
@@ -155,6 +557,11 @@ def main():
         help='Output Directory',
         required=True
     )
+    parser_download.add_argument(
+        '--extract',
+        action='store_true',
+        help='Also extract taxdump.tar.gz (not needed by taxadb create)'
+    )
     parser_download.set_defaults(func=download)
 
     parser_create = subparsers.add_parser(
@@ -171,28 +578,30 @@ def main():
         help='Number of sequences to insert in bulk (default: %(default)s)',
         default=500
     )
-    parser_create.add_argument(
+    parser_input = parser_create.add_mutually_exclusive_group(required=True)
+    parser_input.add_argument(
         '--input',
         '-i',
         metavar='<dir>',
-        help='Input directory (where you first downloaded the files)',
-        required=True
+        help='Input directory (where you first downloaded the files)'
     )
-    parser_create.add_argument(
-        '--dbname',
-        '-n',
-        default='taxadb',
-        metavar='taxadb',
-        help='name of the database (default: %(default)s))'
+    parser_input.add_argument(
+        '--from-parquet',
+        metavar='<dir>',
+        help='Build from the parquet or arrow files written by taxadb export'
+    )
+    parser_input.add_argument(
+        '--url',
+        metavar='<url>',
+        help='Build while downloading from this mirror of the ncbi taxonomy '
+        '(e.g. ftp://ftp.ncbi.nlm.nih.gov/pub/taxonomy)'
     )
     parser_create.add_argument(
-        '--dbtype',
-        '-t',
-        choices=['sqlite', 'mysql', 'postgres'],
-        default='sqlite',
-        metavar='[sqlite|mysql|postgres]',
-        help='type of the database (default: %(default)s))'
+        '--pipeline',
+        action='store_true',
+        help='Read, decompress, parse and insert the --input files in parallel stages'
     )
+    _add_database_arguments(parser_create)
     parser_create.add_argument(
         '--division',
         '-d',
@@ -202,31 +611,223 @@ def main():
         help='division to build (default: %(default)s))'
     )
     parser_create.add_argument(
-        '--hostname',
-        '-H',
-        default='localhost',
-        action="store",
-        help='Database connection host (Optional, for MySQLdatabase and PostgreSQLdatabase) (default: %(default)s)'
+        '--include-taxa',
+        metavar='<taxid,...>',
+        type=_taxid_list,
+        default=None,
+        help='Only build the clades rooted at these taxids (e.g. 2,2157 for '
+        'bacteria and archaea)'
     )
     parser_create.add_argument(
-        '--password',
-        '-p',
+        '--exclude-taxa',
+        metavar='<taxid,...>',
+        type=_taxid_list,
         default=None,
-        help='Password to use (required for MySQLdatabase and PostgreSQLdatabase)'
+        help='Leave out the clades rooted at these taxids'
     )
     parser_create.add_argument(
-        '--port',
-        '-P',
-        help='Database connection port (default: 5432 (postgres), 3306 (MySQL))'
+        '--shards',
+        metavar='<#shards>',
+        type=int,
+        default=1,
+        help='Spread each sequence table over this number of shards: hash '
+        'partitions (postgres) or separate files (sqlite) (default: %(default)s)'
     )
     parser_create.add_argument(
-        '--username',
-        '-u',
+        '--bloom',
+        action='store_true',
+        help='Build a bloom filter per sequence table to skip lookups of absent accessions'
+    )
+    parser_create.add_argument(
+        '--bloom-error-rate',
+        metavar='<rate>',
+        type=float,
+        default=0.01,
+        help='False positive rate of the bloom filters (default: %(default)s)'
+    )
+    parser_create.add_argument(
+        '--metrics',
+        '-m',
+        metavar='<file>',
         default=None,
-        help='Username to login as (required for MySQLdatabase and PostgreSQLdatabase)'
+        help='Write build metrics (phase timings, row counts) to this file'
+    )
+    parser_create.add_argument(
+        '--metrics-format',
+        choices=['json', 'prometheus'],
+        default='json',
+        metavar='[json|prometheus]',
+        help='format of the metrics file (default: %(default)s))'
     )
     parser_create.set_defaults(func=create_db)
 
+    parser_export = subparsers.add_parser(
+        'export',
+        prog='taxadb export',
+        description='export the database to parquet or arrow files',
+        help='export the database to parquet or arrow files'
+    )
+    parser_export.add_argument(
+        '--outdir',
+        '-o',
+        metavar='<dir>',
+        help='Output Directory',
+        required=True
+    )
+    parser_export.add_argument(
+        '--format',
+        '-f',
+        choices=['parquet', 'arrow'],
+        default='parquet',
+        metavar='[parquet|arrow]',
+        help='format of the exported files (default: %(default)s))'
+    )
+    parser_export.add_argument(
+        '--batch-size',
+        '-b',
+        metavar='<#rows>',
+        type=int,
+        default=1000000,
+        help='Number of rows per record batch (default: %(default)s)'
+    )
+    _add_database_arguments(parser_export, readonly=True)
+    parser_export.set_defaults(func=export)
+
+    parser_annotate = subparsers.add_parser(
+        'annotate',
+        prog='taxadb annotate',
+        description='annotate a tabular file (e.g. blast or diamond output) with the taxonomy of its accession numbers',
+        help='annotate a tabular file with the taxonomy of its accession numbers'
+    )
+    parser_annotate.add_argument(
+        '--input',
+        '-i',
+        metavar='<file>',
+        help='File to annotate',
+        required=True
+    )
+    parser_annotate.add_argument(
+        '--output',
+        '-o',
+        metavar='<file>',
+        help='Annotated file',
+        required=True
+    )
+    parser_annotate.add_argument(
+        '--field',
+        '-f',
+        choices=['taxid', 'sci_name', 'lineage_id', 'lineage_name'],
+        default='sci_name',
+        metavar='[taxid|sci_name|lineage_id|lineage_name]',
+        help='annotation to add (default: %(default)s))'
+    )
+    parser_annotate.add_argument(
+        '--column',
+        '-c',
+        metavar='<#column>',
+        type=int,
+        default=2,
+        help='Column holding the accession numbers, 1-based (default: %(default)s)'
+    )
+    parser_annotate.add_argument(
+        '--table',
+        '-T',
+        choices=['est', 'gb', 'gss', 'wgs', 'prot'],
+        default=None,
+        metavar='[est|gb|gss|wgs|prot]',
+        help='table of the accession numbers (default: routed by accession prefix)'
+    )
+    parser_annotate.add_argument(
+        '--processes',
+        '-j',
+        metavar='<#processes>',
+        type=int,
+        default=None,
+        help='Number of worker processes (default: number of cores)'
+    )
+    parser_annotate.add_argument(
+        '--batch-size',
+        '-b',
+        metavar='<#lines>',
+        type=int,
+        default=100000,
+        help='Number of lines looked up at a time by each process, to bound memory (default: %(default)s)'
+    )
+    parser_annotate.add_argument(
+        '--unordered',
+        action='store_true',
+        help='Write annotated shards as they complete, not in input order'
+    )
+    parser_annotate.add_argument(
+        '--keep-version',
+        action='store_true',
+        help='Do not strip the version (e.g. .1) from accession numbers'
+    )
+    _add_database_arguments(parser_annotate, readonly=True)
+    parser_annotate.set_defaults(func=annotate_file)
+
+    parser_rollup = subparsers.add_parser(
+        'rollup',
+        prog='taxadb rollup',
+        description='add counts per taxid (one column per sample) up the taxonomy to clade counts',
+        help='add counts per taxid up the taxonomy to clade counts'
+    )
+    parser_rollup.add_argument(
+        '--input',
+        '-i',
+        metavar='<file>',
+        help='Tab separated counts: taxid, then one column per sample',
+        required=True
+    )
+    parser_rollup.add_argument(
+        '--output',
+        '-o',
+        metavar='<file>',
+        help='Clade counts',
+        required=True
+    )
+    parser_rollup.add_argument(
+        '--ranks',
+        '-r',
+        metavar='<rank,...>',
+        type=lambda value: value.split(','),
+        default=None,
+        help='Only write the clades of these ranks (e.g. genus,species)'
+    )
+    _add_database_arguments(parser_rollup, readonly=True)
+    parser_rollup.set_defaults(func=rollup_counts)
+
+    parser_snapshot = subparsers.add_parser(
+        'snapshot',
+        prog='taxadb snapshot',
+        description='save the taxonomy and hot accession numbers of the database to arrays loaded with mmap',
+        help='save a snapshot of the database for fast startup'
+    )
+    parser_snapshot.add_argument(
+        '--outdir',
+        '-o',
+        metavar='<dir>',
+        default=None,
+        help='Snapshot directory (default: <dbname>.snapshot)'
+    )
+    parser_snapshot.add_argument(
+        '--hot-accessions',
+        '-a',
+        metavar='<file>',
+        default=None,
+        help='Accession numbers to cache in the snapshot, one per line'
+    )
+    parser_snapshot.add_argument(
+        '--table',
+        '-T',
+        choices=['est', 'gb', 'gss', 'wgs', 'prot'],
+        default=None,
+        metavar='[est|gb|gss|wgs|prot]',
+        help='table of the hot accession numbers, which only answer lookups in this table (default: routed by accession prefix)'
+    )
+    _add_database_arguments(parser_snapshot, readonly=True)
+    parser_snapshot.set_defaults(func=make_snapshot)
+
     parser_query = subparsers.add_parser(
         'query',
         prog='taxadb query',
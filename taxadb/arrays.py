@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+from collections import namedtuple
+
+from taxadb.schema import *
+from taxadb import accession
+from taxadb import shard
+from taxadb import snapshot
+
+# value of the missing entries in the returned arrays
+MISSING = -1
+
+# number of accession numbers per query
+CHUNK = 500
+
+Taxonomy = namedtuple('Taxonomy', [
+    'taxid', 'parent', 'rank', 'name', 'ranks', 'names'])
+Taxonomy.__doc__ = """The Taxa table as arrays, sorted by taxid
+
+Fields:
+taxid -- taxids (int64), sorted
+parent -- index of the parent of each taxon in taxid (int64)
+rank -- rank code of each taxon, an index into ranks (int32)
+name -- scientific name of each taxon, an index into names (int64)
+ranks -- array of the rank names
+names -- array of the interned scientific names
+"""
+
+Batch = namedtuple('Batch', [
+    'taxid', 'parent', 'rank', 'name', 'ranks', 'names'])
+Batch.__doc__ = """Taxonomic information of a batch, aligned with the input
+
+Fields:
+taxid -- taxid of each entry (int64)
+parent -- taxid of the parent of each entry (int64)
+rank -- rank code of each entry, an index into ranks (int32)
+name -- scientific name of each entry, an index into names (int64)
+ranks -- array of the rank names
+names -- array of the interned scientific names
+Missing entries are set to MISSING in every array.
+"""
+
+_taxonomies = {}
+
+
+def _numpy():
+    """Import numpy, exit with an error message if it is not installed"""
+    try:
+        import numpy
+    except ImportError:
+        print('[ERROR] the array functions require numpy '
+              '(pip install taxadb[numpy])', file=sys.stderr)
+        sys.exit(1)
+    return numpy
+
+
+def taxonomy(db_name, **kwargs):
+    """given a database, return its Taxa table as a Taxonomy of arrays. The
+    table is read once per process and database, or mapped from the snapshot
+    of the database if there is one (see save_snapshot).
+
+    Arguments:
+    db_name -- the path to the database to query
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    """
+    snap = snapshot.get(db_name, **kwargs)
+    if snap is not None:
+        return Taxonomy(**snap.taxonomy)
+    key = _cache_key(db_name, **kwargs)
+    if key not in _taxonomies:
+        database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
+        db.initialize(database)
+        db.connect()
+        _taxonomies[key] = _load_taxonomy()
+        db.close()
+    return _taxonomies[key]
+
+
+def _cache_key(db_name, **kwargs):
+    """Identify a database, and the state of a sqlite database file, as the
+    key of the Taxonomy cache"""
+    key = (db_name, kwargs.get('dbtype'), kwargs.get('hostname'),
+           kwargs.get('port'))
+    if kwargs.get('dbtype') == 'sqlite':
+        key += (os.path.getmtime(db_name),)
+    return key
+
+
+def _load_taxonomy():
+    """Read the Taxa table of the connected database into a Taxonomy"""
+    np = _numpy()
+    taxids, parents, ranks, names = [], [], [], []
+    rank_codes, name_codes = {}, {}
+    query = stream(Taxa.select(
+        Taxa.ncbi_taxid, Taxa.parent_taxid, Taxa.lineage_level,
+        Taxa.tax_name))
+    for taxid, parent, rank, name in query:
+        taxids.append(taxid)
+        parents.append(parent)
+        ranks.append(rank_codes.setdefault(rank, len(rank_codes)))
+        names.append(name_codes.setdefault(name, len(name_codes)))
+    taxids = np.array(taxids, dtype=np.int64)
+    order = np.argsort(taxids, kind='mergesort')
+    taxids = taxids[order]
+    parents = np.array(parents, dtype=np.int64)[order]
+    return Taxonomy(
+        taxid=taxids,
+        parent=_index(taxids, parents),
+        rank=np.array(ranks, dtype=np.int32)[order],
+        name=np.array(names, dtype=np.int64)[order],
+        ranks=np.array(list(rank_codes), dtype=object),
+        names=np.array(list(name_codes), dtype=object))
+
+
+def _index(sorted_taxids, taxids):
+    """Return the index of each taxid in sorted_taxids, MISSING if absent"""
+    np = _numpy()
+    taxids = np.asarray(taxids, dtype=np.int64)
+    idx = np.searchsorted(sorted_taxids, taxids)
+    idx[idx == len(sorted_taxids)] = 0
+    found = len(sorted_taxids) > 0
+    if found:
+        found = sorted_taxids[idx] == taxids
+    return np.where(found, idx, MISSING)
+
+
+def taxa(taxids, db_name, **kwargs):
+    """given a sequence or array of taxids, return a Batch of arrays aligned
+    with it: taxid, parent, rank code and name index
+
+    Arguments:
+    taxids -- a sequence or array of taxids
+    db_name -- the path to the database to query
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    """
+    return _batch(taxonomy(db_name, **kwargs), taxids)
+
+
+def _batch(tax, taxids):
+    """Build the Batch of taxids from a Taxonomy"""
+    np = _numpy()
+    idx = _index(tax.taxid, taxids)
+    if not len(tax.taxid):
+        # empty Taxa table: nothing to index, every entry is missing
+        missing = np.full(len(idx), MISSING, dtype=np.int64)
+        return Batch(taxid=missing, parent=missing,
+                     rank=missing.astype(np.int32), name=missing,
+                     ranks=tax.ranks, names=tax.names)
+    found = idx != MISSING
+    parent = tax.parent[idx]
+    return Batch(
+        taxid=np.where(found, tax.taxid[idx], MISSING),
+        parent=np.where(found & (parent != MISSING), tax.taxid[parent],
+                        MISSING),
+        rank=np.where(found, tax.rank[idx], MISSING).astype(np.int32),
+        name=np.where(found, tax.name[idx], MISSING),
+        ranks=tax.ranks,
+        names=tax.names)
+
+
+def accession_taxid(acc_number_list, db_name, table=None, **kwargs):
+    """given a sequence or array of accession numbers, return an array of
+    their taxids, aligned with acc_number_list. Accession numbers which are
+    not found are set to MISSING. Each distinct accession is queried once,
+    except the hot accessions of the snapshot of the database, which are not
+    queried if the snapshot was saved for the same table (see
+    save_snapshot).
+
+    Arguments:
+    acc_number_list -- a sequence or array of accession numbers
+    db_name -- the path to the database to query
+    table -- the table containing the accession numbers. If None, each
+        accession number is looked up in the table(s) where its prefix was
+        found when the database was built
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    """
+    np = _numpy()
+    unique, inverse = np.unique(
+        np.asarray(acc_number_list, dtype=str), return_inverse=True)
+    taxids = np.full(len(unique), MISSING, dtype=np.int64)
+    snap = snapshot.get(db_name, **kwargs)
+    if snap is not None and snap.table == _table_name(table):
+        taxids = _hot_taxids(snap, unique)
+    todo = taxids == MISSING
+    if todo.any():
+        taxids[todo] = _query_taxids(unique[todo].tolist(), db_name, table,
+                                     **kwargs)
+    return taxids[inverse]
+
+
+def _table_name(table):
+    """Name of a sequence table, None to route by prefix"""
+    return table._meta.db_table if table is not None else None
+
+
+def _hot_taxids(snap, accessions):
+    """Return the taxids of the hot accessions of a snapshot, MISSING for
+    the other accession numbers"""
+    np = _numpy()
+    keys = np.asarray(accessions, dtype=str).astype(bytes)
+    taxids = np.full(len(keys), MISSING, dtype=np.int64)
+    if not len(snap.accessions) or not len(keys):
+        return taxids
+    idx = np.searchsorted(snap.accessions, keys)
+    idx[idx == len(snap.accessions)] = 0
+    hit = snap.accessions[idx] == keys
+    taxids[hit] = snap.taxids[idx[hit]]
+    return taxids
+
+
+def _query_taxids(acc_number_list, db_name, table=None, **kwargs):
+    """Query the taxids of distinct accession numbers, see accession_taxid"""
+    np = _numpy()
+    database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
+    db.initialize(database)
+    db.connect()
+    found = {}
+    with db.atomic():
+        for seq_table, accessions in accession._route(table, acc_number_list):
+            accessions = accession._filter(db_name, seq_table, accessions,
+                                          **kwargs)
+            shards = shard.count(seq_table)
+            if shards:
+                found.update(shard.lookup(seq_table, shards, accessions,
+                                          db_name, CHUNK, **kwargs))
+                continue
+            for i in range(0, len(accessions), CHUNK):
+                query = seq_table.select(
+                    seq_table.accession, seq_table.taxid).where(
+                    seq_table.accession << accessions[i:i + CHUNK])
+                found.update(stream(query))
+    db.close()
+    return np.array([found.get(acc, MISSING) for acc in acc_number_list],
+                    dtype=np.int64)
+
+
+def accession_taxa(acc_number_list, db_name, table=None, **kwargs):
+    """given a sequence or array of accession numbers, return a Batch of
+    arrays aligned with it: taxid, parent, rank code and name index
+
+    Arguments:
+    acc_number_list -- a sequence or array of accession numbers
+    db_name -- the path to the database to query
+    table -- the table containing the accession numbers, or None (see
+        accession_taxid)
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    """
+    taxids = accession_taxid(acc_number_list, db_name, table, **kwargs)
+    return taxa(taxids, db_name, **kwargs)
+
+
+def save_snapshot(db_name, outdir=None, hot_accessions=None, table=None,
+                  **kwargs):
+    """Save the Taxonomy of a database, and the taxids of its most queried
+    accession numbers, to a directory of .npy files which load with mmap
+    (see snapshot). The array functions then use the snapshot instead of
+    reading the Taxa table, and only query the database for the accession
+    numbers which are not in it. The snapshot is built from the database,
+    not from the snapshot it replaces, and its hot accession numbers are
+    only used by lookups in the same table (or routed by prefix, if table is
+    None).
+
+    Arguments:
+    db_name -- the path to the database
+    outdir -- the snapshot directory, default snapshot.path(db_name)
+    hot_accessions -- optional list of accession numbers to cache
+    table -- the table of the hot accession numbers, or None to route them
+        by prefix
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    Returns the number of hot accession numbers cached
+    """
+    np = _numpy()
+    kwargs = dict(kwargs, snapshot=False)
+    outdir = outdir or snapshot.path(db_name, **kwargs)
+    db_source = snapshot.source(db_name, **kwargs)
+    database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
+    db.initialize(database)
+    db.connect()
+    tax = _load_taxonomy()
+    db.close()
+    accessions = np.unique(np.asarray(hot_accessions or [], dtype=str))
+    taxids = np.zeros(0, dtype=np.int64)
+    if len(accessions):
+        taxids = accession_taxid(accessions, db_name, table, **kwargs)
+        found = taxids != MISSING
+        accessions, taxids = accessions[found], taxids[found]
+    snapshot.write(outdir, tax._asdict(), accessions, taxids, db_source,
+                   _table_name(table))
+    return len(accessions)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+from taxadb import util
+
+MAGIC = b'TAXBLOOM'
+HEADER = struct.Struct('<8sQQQ')  # magic, bits, hashes, keys
+
+_loaded = {}
+
+
+class BloomFilter(object):
+    """Bloom filter over accession numbers. A key reported absent is
+    definitely absent, a key reported present is present with a probability
+    of 1 - false_positive_rate().
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        :param capacity: Number of keys the filter is sized for
+        :type capacity: int
+        :param error_rate: Target false positive rate at full capacity
+        :type error_rate: float
+        """
+        capacity = max(capacity, 1)
+        self.size = max(int(-capacity * math.log(error_rate) /
+                            math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.count = 0
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.md5(key.encode()).digest()
+        h1, h2 = struct.unpack('<QQ', digest)
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        """Add a key to the filter
+
+        Arguments:
+        key -- an accession number
+        """
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def false_positive_rate(self):
+        """Return the expected false positive rate for the number of keys
+        added to the filter"""
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** \
+            self.hashes
+
+    def save(self, path):
+        """Write the filter to a file
+
+        Arguments:
+        path -- output file
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, self.size, self.hashes, self.count))
+            f.write(self.bits)
+
+    @classmethod
+    def load(cls, path):
+        """Read a filter written by save. The bit array is memory mapped, so
+        loading is immediate and the pages are shared between processes.
+
+        Arguments:
+        path -- filter file
+        """
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, size, hashes, count = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError('%s is not a taxadb bloom filter' % path)
+        bloom = cls.__new__(cls)
+        bloom.size = size
+        bloom.hashes = hashes
+        bloom.count = count
+        bloom.bits = memoryview(data)[HEADER.size:]
+        return bloom
+
+
+def path(db_name, division, **kwargs):
+    """Return the path of the filter of a sequence table. Filters are stored
+    next to sqlite databases, and in util.CACHE_DIR for other database types
+    (see util.database_file).
+
+    Arguments:
+    db_name -- the path to (or name of) the database
+    division -- name of the sequence table (e.g.: gb)
+    kwargs -- the options of the database (dbtype/hostname/port)
+    """
+    return util.database_file(db_name, '%s.bloom' % division, **kwargs)
+
+
+def get(db_name, division, **kwargs):
+    """Return the filter of a sequence table, or None if it was not built.
+    Filters are loaded once per process.
+
+    Arguments:
+    db_name -- the path to (or name of) the database
+    division -- name of the sequence table (e.g.: gb)
+    kwargs -- the options of the database (dbtype/hostname/port)
+    """
+    filter_path = path(db_name, division, **kwargs)
+    try:
+        mtime = os.path.getmtime(filter_path)
+    except OSError:
+        return None
+    cached = _loaded.get(filter_path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, BloomFilter.load(filter_path))
+        _loaded[filter_path] = cached
+    return cached[1]
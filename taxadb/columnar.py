@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+import os
+import sys
+
+from taxadb.schema import *
+from taxadb import accession
+from taxadb import shard
+
+# ranks projected as columns of the lineage file
+RANKS = ['superkingdom', 'phylum', 'class', 'order', 'family', 'genus',
+         'species']
+
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _pyarrow():
+    """Import pyarrow, exit with an error message if it is not installed"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        print('[ERROR] parquet and arrow support requires pyarrow '
+              '(pip install taxadb[parquet])', file=sys.stderr)
+        sys.exit(1)
+    return pyarrow
+
+
+class _Writer(object):
+    """Write record batches to a parquet or arrow (IPC) file"""
+
+    def __init__(self, path, schema, format):
+        pa = _pyarrow()
+        if format == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(path, schema)
+            self.write_batch = lambda b: self.writer.write_table(
+                pa.Table.from_batches([b]))
+        else:
+            self.sink = pa.OSFile(path, 'wb')
+            self.writer = pa.ipc.new_file(self.sink, schema)
+            self.write_batch = self.writer.write_batch
+
+    def close(self):
+        self.writer.close()
+        if hasattr(self, 'sink'):
+            self.sink.close()
+
+
+def export(outdir, format='parquet', batch_size=1000000, db_name=None):
+    """Export the database to one columnar file per table: taxa, lineage
+    (the lineage and the ancestor at each major rank of every taxon) and each
+    sequence table. Names and ranks are dictionary encoded. The database must
+    be initialized and connected.
+
+    Arguments:
+    outdir -- output directory
+    format -- 'parquet' or 'arrow', default 'parquet'
+    batch_size -- number of rows per record batch, default 1000000
+    db_name -- the path to the database, needed to read the sequence tables
+        sharded over sqlite files
+    """
+    pa = _pyarrow()
+    os.makedirs(outdir, exist_ok=True)
+    ext = EXTENSIONS[format]
+
+    # Taxa is small enough to be held in memory, which gives a single
+    # dictionary for names and ranks across all batches
+    rows = list(stream(Taxa.select(
+        Taxa.ncbi_taxid, Taxa.parent_taxid, Taxa.tax_name,
+        Taxa.lineage_level)))
+    taxids, parents, names, ranks = zip(*rows) if rows else ([],) * 4
+    del rows
+    taxa = pa.table({
+        'ncbi_taxid': pa.array(taxids, pa.int64()),
+        'parent_taxid': pa.array(parents, pa.int64()),
+        'tax_name': pa.array(names, pa.string()).dictionary_encode(),
+        'lineage_level': pa.array(ranks, pa.string()).dictionary_encode()
+    })
+    _write_table(taxa, os.path.join(outdir, 'taxa' + ext), format,
+                 batch_size)
+    print('taxa: %d rows exported' % len(taxa))
+
+    nodes = dict(zip(taxids, zip(names, parents)))
+    rank_of = dict(zip(taxids, ranks))
+    # parents missing from Taxa end the lineages, as the root does
+    missing = {parent: () for parent in parents if parent not in nodes}
+    del taxa, parents, names, ranks
+    schema = pa.schema(
+        [('ncbi_taxid', pa.int64()), ('lineage', pa.list_(pa.int64()))] +
+        [(rank, pa.int64()) for rank in RANKS])
+    writer = _Writer(os.path.join(outdir, 'lineage' + ext), schema, format)
+    for start in range(0, len(taxids), batch_size):
+        # lineages are memoized per batch, bounding the memo to the size of
+        # the batch written
+        lineages = dict(missing)
+        columns = {name: [] for name in schema.names}
+        for taxid in taxids[start:start + batch_size]:
+            lineage = accession._lineage(taxid, nodes, lineages)
+            at_rank = {rank_of[t]: t for t in reversed(lineage)}
+            columns['ncbi_taxid'].append(taxid)
+            columns['lineage'].append(list(lineage))
+            for rank in RANKS:
+                columns[rank].append(at_rank.get(rank))
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema))
+    writer.close()
+    print('lineage: %d rows exported' % len(taxids))
+
+    schema = pa.schema([('accession', pa.string()), ('taxid', pa.int64())])
+    for table in SEQUENCE_TABLES:
+        if not table.table_exists():
+            continue
+        name = table._meta.db_table
+        shards = shard.count(table)
+        if shards:
+            query = shard.rows(table, shards, db_name)
+        else:
+            query = stream(table.select(table.accession, table.taxid))
+        writer = _Writer(os.path.join(outdir, name + ext), schema, format)
+        exported = 0
+        while True:
+            rows = list(itertools.islice(query, batch_size))
+            if not rows:
+                break
+            accessions, taxids = zip(*rows)
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [pa.array(accessions, pa.string()),
+                 pa.array(taxids, pa.int64())], schema=schema))
+            exported += len(rows)
+        writer.close()
+        print('%s: %d rows exported' % (name, exported))
+
+
+def _write_table(table, path, format, batch_size):
+    """Write an in-memory arrow table in batches of batch_size rows"""
+    writer = _Writer(path, table.schema, format)
+    for batch in table.to_batches(max_chunksize=batch_size):
+        writer.write_batch(batch)
+    writer.close()
+
+
+def path(indir, name):
+    """Return the path of the exported file of a table in indir, or None if
+    the table was not exported
+
+    Arguments:
+    indir -- directory created by 'taxadb export'
+    name -- name of the table (e.g.: taxa, gb)
+    """
+    for ext in EXTENSIONS.values():
+        table_path = os.path.join(indir, name + ext)
+        if os.path.exists(table_path):
+            return table_path
+    return None
+
+
+def read(table_path, chunk):
+    """Yield the rows of an exported file, as lists of at most chunk dicts,
+    ready to be inserted with insert_many
+
+    Arguments:
+    table_path -- a .parquet or .arrow file written by export
+    chunk -- number of rows per list
+    """
+    pa = _pyarrow()
+    if table_path.endswith(EXTENSIONS['parquet']):
+        batches = pa.parquet.ParquetFile(table_path).iter_batches(
+            batch_size=chunk)
+    else:
+        reader = pa.ipc.open_file(pa.memory_map(table_path))
+        batches = (reader.get_batch(i)
+                   for i in range(reader.num_record_batches))
+    for batch in batches:
+        columns = batch.to_pydict()
+        names = list(columns)
+        rows = [dict(zip(names, values))
+                for values in zip(*(columns[n] for n in names))]
+        for i in range(0, len(rows), chunk):
+            yield rows[i:i + chunk]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+# Upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10,
+           float('inf')]
+
+_hooks = []
+
+
+def add_hook(hook):
+    """Register a callable receiving every metric event
+
+    A hook is called as hook(kind, name, value), where kind is one of
+    'phase' (seconds spent in a phase), 'latency' (seconds taken by one
+    operation) or 'counter' (increment of a counter).
+
+    Arguments:
+    hook -- the callable to register
+    """
+    _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    """Unregister a hook previously registered with add_hook
+
+    Arguments:
+    hook -- the callable to unregister
+    """
+    _hooks.remove(hook)
+
+
+def enabled():
+    """Return True if at least one hook is registered"""
+    return bool(_hooks)
+
+
+def emit(kind, name, value):
+    """Send a metric event to every registered hook
+
+    Arguments:
+    kind -- 'phase', 'latency' or 'counter'
+    name -- name of the metric (e.g.: parse.nodes)
+    value -- seconds for phases and latencies, increment for counters
+    """
+    for hook in _hooks:
+        hook(kind, name, value)
+
+
+def count(name, value=1):
+    """Increment a counter
+
+    Arguments:
+    name -- name of the counter
+    value -- increment, default 1
+    """
+    if _hooks:
+        emit('counter', name, value)
+
+
+class timer(object):
+    """Context manager timing a block of code. The time is only measured when
+    hooks are registered.
+
+    Usage:
+    with metrics.timer('create.taxa.insert'):
+        ...
+    """
+    __slots__ = ('name', 'kind', 'start')
+
+    def __init__(self, name, kind='phase'):
+        """
+        :param name: Name of the metric
+        :type name: str
+        :param kind: Kind of event to emit, 'phase' or 'latency'
+        :type kind: str
+        """
+        self.name = name
+        self.kind = kind
+        self.start = None
+
+    def __enter__(self):
+        if _hooks:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            emit(self.kind, self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Collector(object):
+    """Hook aggregating metric events in memory: total time per phase, counter
+    totals and latency histograms"""
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.latencies = {}
+
+    def __call__(self, kind, name, value):
+        if kind == 'counter':
+            self.counters[name] = self.counters.get(name, 0) + value
+        elif kind == 'phase':
+            self.phases[name] = self.phases.get(name, 0.0) + value
+        elif kind == 'latency':
+            if name not in self.latencies:
+                self.latencies[name] = {
+                    'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS)}
+            histogram = self.latencies[name]
+            histogram['count'] += 1
+            histogram['sum'] += value
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+
+    def to_json(self):
+        """Return the collected metrics as a JSON string"""
+        latencies = {}
+        for name, histogram in self.latencies.items():
+            latencies[name] = {
+                'count': histogram['count'],
+                'sum': histogram['sum'],
+                'buckets': dict(zip(
+                    [str(b) for b in BUCKETS], histogram['buckets']))
+            }
+        return json.dumps({
+            'phases': self.phases,
+            'counters': self.counters,
+            'latencies': latencies
+        }, indent=2, sort_keys=True)
+
+    def to_prometheus(self):
+        """Return the collected metrics in the Prometheus text format"""
+        lines = [
+            '# TYPE taxadb_phase_seconds_total counter'
+        ]
+        for name, value in sorted(self.phases.items()):
+            lines.append('taxadb_phase_seconds_total{phase="%s"} %f' % (
+                name, value))
+        lines.append('# TYPE taxadb_events_total counter')
+        for name, value in sorted(self.counters.items()):
+            lines.append('taxadb_events_total{name="%s"} %d' % (name, value))
+        lines.append('# TYPE taxadb_latency_seconds histogram')
+        for name, histogram in sorted(self.latencies.items()):
+            cumulative = 0
+            for bound, value in zip(BUCKETS, histogram['buckets']):
+                cumulative += value
+                le = '+Inf' if bound == float('inf') else str(bound)
+                lines.append(
+                    'taxadb_latency_seconds_bucket{name="%s",le="%s"} %d' % (
+                        name, le, cumulative))
+            lines.append('taxadb_latency_seconds_sum{name="%s"} %f' % (
+                name, histogram['sum']))
+            lines.append('taxadb_latency_seconds_count{name="%s"} %d' % (
+                name, histogram['count']))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path, format='json'):
+        """Write the collected metrics to a file
+
+        Arguments:
+        path -- output file
+        format -- 'json' or 'prometheus', default 'json'
+        """
+        with open(path, 'w') as f:
+            if format == 'prometheus':
+                f.write(self.to_prometheus())
+            else:
+                f.write(self.to_json())
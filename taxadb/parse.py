@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import gzip
+from taxadb import metrics
 from taxadb.schema import Taxa
 
 
@@ -13,9 +14,44 @@ def taxdump(nodes_file, names_file):
     nodes_file -- the nodes.dmp file
     names_file -- the names.dmp file
     """
-    # parse nodes.dmp
-    nodes_data = list()
     with open(nodes_file, 'r') as f:
+        nodes_data = _nodes(f)
+    with open(names_file, 'r') as f:
+        names_data = _names(f)
+    return _merge(nodes_data, names_data)
+
+
+def taxdump_archive(archive):
+    """Parse nodes.dmp and names.dmp straight out of taxdump.tar.gz, without
+    extracting it. The archive is read sequentially, so it can be a stream
+    which is still being downloaded.
+
+    Arguments:
+    archive -- the path to taxdump.tar.gz, or a file object reading it
+    """
+    import tarfile
+    if isinstance(archive, str):
+        tar = tarfile.open(archive, 'r|gz')
+    else:
+        tar = tarfile.open(fileobj=archive, mode='r|gz')
+    nodes_data = names_data = None
+    with tar:
+        for member in tar:
+            if member.name == 'nodes.dmp':
+                nodes_data = _nodes(l.decode() for l in tar.extractfile(member))
+            elif member.name == 'names.dmp':
+                names_data = _names(l.decode() for l in tar.extractfile(member))
+            if nodes_data is not None and names_data is not None:
+                break
+    if nodes_data is None or names_data is None:
+        raise ValueError('nodes.dmp or names.dmp missing from %s' % archive)
+    return _merge(nodes_data, names_data)
+
+
+def _nodes(f):
+    """Parse the lines of nodes.dmp"""
+    nodes_data = list()
+    with metrics.timer('parse.nodes'):
         for line in f:
             line_list = line.split('|')
             data_dict = {
@@ -26,10 +62,13 @@ def taxdump(nodes_file, names_file):
                 }
             nodes_data.append(data_dict)
     print('parsed nodes')
+    return nodes_data
+
 
-    # parse names.dmp
+def _names(f):
+    """Parse the scientific names of names.dmp"""
     names_data = list()
-    with open(names_file, 'r') as f:
+    with metrics.timer('parse.names'):
         for line in f:
             if 'scientific name' in line:
                 line_list = line.split('|')
@@ -39,50 +78,118 @@ def taxdump(nodes_file, names_file):
                     }
                 names_data.append(data_dict)
     print('parsed names')
+    return names_data
+
 
-    # merge the two dictionaries
+def _merge(nodes_data, names_data):
+    """Merge the parsed nodes and names in a list of Taxa rows"""
     taxa_info_list = list()
-    for nodes, names in zip(nodes_data, names_data):
-        taxa_info = {**nodes, **names}  # PEP 448, requires python 3.5
-        taxa_info_list.append(taxa_info)
+    with metrics.timer('parse.merge'):
+        for nodes, names in zip(nodes_data, names_data):
+            taxa_info = {**nodes, **names}  # PEP 448, requires python 3.5
+            taxa_info_list.append(taxa_info)
+    metrics.count('parse.taxdump.rows', len(taxa_info_list))
     print('merge successful')
     return taxa_info_list
 
 
-def accession2taxid(acc2taxid, chunk):
+def clade(nodes, include, exclude=()):
+    """Select the taxa of the clades rooted at the include taxids, without the
+    clades rooted at the exclude taxids.
+
+    Arguments:
+    nodes -- iterable of (taxid, parent taxid) of every taxon, e.g. the
+        ncbi_taxid and parent_taxid of the rows returned by taxdump
+    include -- taxids of the roots of the selected clades. If empty, the
+        whole tree is selected
+    exclude -- taxids of the roots of the clades removed from the selection
+    Returns (members, ancestors): the set of the selected taxids, and the set
+    of the taxids of their ancestors, which their lineages need
+    """
+    parents = {}
+    children = {}
+    with metrics.timer('parse.clade'):
+        for taxid, parent in nodes:
+            taxid, parent = int(taxid), int(parent)
+            parents[taxid] = parent
+            if parent != taxid:
+                children.setdefault(parent, []).append(taxid)
+        if not include:
+            include = [t for t, p in parents.items() if t == p]
+        exclude = set(exclude)
+        members = set()
+        stack = [t for t in include if t in parents and t not in exclude]
+        while stack:
+            taxid = stack.pop()
+            if taxid not in members:
+                members.add(taxid)
+                stack.extend(c for c in children.get(taxid, ())
+                             if c not in exclude)
+        ancestors = set()
+        for taxid in include:
+            while taxid in parents and parents[taxid] != taxid:
+                taxid = parents[taxid]
+                if taxid not in members:
+                    ancestors.add(taxid)
+    metrics.count('parse.clade.members', len(members))
+    return members, ancestors
+
+
+def accession2taxid(acc2taxid, chunk, taxids=None):
     """Parses the accession2taxid files and insert sequences in Sequences table(s).
 
     Arguments:
-    acc2taxid -- input file (gzipped)
+    acc2taxid -- input file (gzipped), or an iterable of its decompressed
+        lines (as bytes, e.g. from pipeline.lines)
     chunk -- Chunk size of entries to gather before yielding, default 500
+    taxids -- optional set of taxids (int) to keep, e.g. the members
+        returned by clade. They must all be in the Taxa table, which is then
+        not queried
     """
+    if not chunk:
+        chunk = 500
+    if isinstance(acc2taxid, str):
+        with gzip.open(acc2taxid, 'rb') as f:
+            yield from _accession2taxid(f, chunk, taxids)
+    else:
+        yield from _accession2taxid(iter(acc2taxid), chunk, taxids)
+
+
+def _accession2taxid(lines, chunk, allowed=None):
+    """Parse the lines of an accession2taxid file, see accession2taxid"""
     # Some accessions (e.g.: AAA22826) have a taxid = 0
     entries = []
     counter = 0
     taxids = {}
-    if not chunk:
-        chunk = 500
-    with gzip.open(acc2taxid, 'rb') as f:
-        f.readline()  # discard the header
-        for line in f:
-            line_list = line.decode().rstrip('\n').split('\t')
-            if not line_list[2] in taxids:
-                try:
+    if allowed is not None:
+        # no need to probe Taxa: every other taxid is filtered out
+        taxids = dict.fromkeys((str(t) for t in allowed), True)
+    next(lines, None)  # discard the header
+    for line in lines:
+        line_list = line.decode().rstrip('\n').split('\t')
+        if not line_list[2] in taxids:
+            if allowed is not None:
+                continue
+            metrics.count('parse.taxa_probes')
+            try:
+                with metrics.timer('parse.taxa_probes'):
                     Taxa.get(Taxa.ncbi_taxid == int(line_list[2]))
-                    taxids[line_list[2]] = True
-                except Taxa.DoesNotExist:
-                    taxids[line_list[2]] = False
-                    continue
-            if taxids[line_list[2]]:
-                data_dict = {
-                    'accession': line_list[0],
-                    'taxid': line_list[2]
-                }
-                entries.append(data_dict)
-                counter += 1
-            if counter == chunk:
-                yield(entries)
-                entries = []
-                counter = 0
-        if len(entries):
+                taxids[line_list[2]] = True
+            except Taxa.DoesNotExist:
+                taxids[line_list[2]] = False
+                continue
+        if taxids[line_list[2]]:
+            data_dict = {
+                'accession': line_list[0],
+                'taxid': line_list[2]
+            }
+            entries.append(data_dict)
+            counter += 1
+        if counter == chunk:
+            metrics.count('parse.accession2taxid.rows', counter)
             yield(entries)
+            entries = []
+            counter = 0
+    if len(entries):
+        metrics.count('parse.accession2taxid.rows', len(entries))
+        yield(entries)
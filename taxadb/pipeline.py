@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import hashlib
+import io
+import queue
+import threading
+
+from taxadb import metrics
+
+# number of blocks (or batches of lines) each queue can hold
+QUEUE_SIZE = 16
+
+BLOCK_SIZE = 1 << 20
+
+# number of lines per batch passed from the decompression stage
+LINE_BATCH = 10000
+
+_END = object()
+
+
+class _Error(object):
+    """Exception raised in a stage, forwarded to the next one"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _open(source):
+    """Open a local file or an url (ftp://, http://, file://) for reading"""
+    if '://' in source:
+        import urllib.request  # slow to import (http.client, ssl)
+        return urllib.request.urlopen(source)
+    return open(source, 'rb')
+
+
+def _expected_md5(source):
+    """Return the md5 published next to source (source + '.md5'), or None if
+    a local file has no .md5 file. Remote sources must have one."""
+    try:
+        with _open(source + '.md5') as f:
+            return f.read().decode().split()[0]
+    except (IOError, OSError):
+        if '://' in source:
+            raise
+        return None
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True  # do not hang the process if the consumer stops
+    thread.start()
+    return thread
+
+
+def _fetch(source, out):
+    """Stage: download source block by block, and check its md5 at the end"""
+    try:
+        expected = _expected_md5(source)
+        md5 = hashlib.md5()
+        with _open(source) as f:
+            for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+                md5.update(block)
+                metrics.count('pipeline.bytes', len(block))
+                out.put(block)
+        if expected is not None and md5.hexdigest() != expected:
+            raise IOError('md5 mismatch for %s' % source)
+        out.put(_END)
+    except Exception as e:
+        out.put(_Error(e))
+
+
+class Reader(io.RawIOBase):
+    """File object reading the blocks of a queue filled by another stage.
+    Errors raised in that stage are raised by read."""
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.buffer = b''
+        self.done = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self.buffer and not self.done:
+            block = self.blocks.get()
+            if isinstance(block, _Error):
+                self.done = True
+                raise block.error
+            if block is _END:
+                self.done = True
+            else:
+                self.buffer = block
+        n = min(len(b), len(self.buffer))
+        b[:n] = self.buffer[:n]
+        self.buffer = self.buffer[n:]
+        return n
+
+    def drain(self):
+        """Read until the end of the stream, so that the download is
+        complete and its md5 checked"""
+        while self.readinto(bytearray(BLOCK_SIZE)):
+            pass
+
+
+def open_stream(source, queue_size=QUEUE_SIZE):
+    """Return a file object reading source while it is being downloaded (and
+    its md5 checked) in another thread
+
+    Arguments:
+    source -- a local file or an url (ftp://, http://, file://)
+    queue_size -- number of blocks buffered between the stages
+    """
+    blocks = queue.Queue(queue_size)
+    _start(_fetch, source, blocks)
+    return Reader(blocks)
+
+
+def _decompress(stream, out):
+    """Stage: decompress a gzipped stream, in batches of lines"""
+    try:
+        with gzip.GzipFile(fileobj=io.BufferedReader(stream, BLOCK_SIZE)) as f:
+            batch = []
+            for line in f:
+                batch.append(line)
+                if len(batch) == LINE_BATCH:
+                    out.put(batch)
+                    batch = []
+            if batch:
+                out.put(batch)
+        out.put(_END)
+    except Exception as e:
+        out.put(_Error(e))
+
+
+def lines(source, queue_size=QUEUE_SIZE):
+    """Yield the lines of a gzipped file, which is downloaded, checked and
+    decompressed by two threads connected to the caller by bounded queues,
+    so that the caller can parse and insert the lines at the same time
+
+    Arguments:
+    source -- a local file or an url (ftp://, http://, file://)
+    queue_size -- number of blocks, or batches of lines, buffered between
+        the stages
+    """
+    batches = queue.Queue(queue_size)
+    _start(_decompress, open_stream(source, queue_size), batches)
+    while True:
+        batch = batches.get()
+        if isinstance(batch, _Error):
+            raise batch.error
+        if batch is _END:
+            return
+        for line in batch:
+            yield line
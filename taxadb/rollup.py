@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from taxadb import arrays
+
+# depth of each taxon of a Taxonomy, by id of the Taxonomy
+_depths = {}
+
+
+def depth(tax):
+    """Return the depth of each taxon of a Taxonomy (0 for the root, and for
+    taxa whose parent is missing), computed by pointer jumping: each pass
+    doubles the distance jumped, so that the tree is walked in log(height)
+    vectorized passes. Depths are computed once per Taxonomy.
+
+    Arguments:
+    tax -- a Taxonomy, from arrays.taxonomy
+    """
+    cached = _depths.get(id(tax))
+    if cached is not None and cached[0] is tax:
+        return cached[1]
+    np = arrays._numpy()
+    index = np.arange(len(tax.taxid))
+    roots = (tax.parent == index) | (tax.parent == arrays.MISSING)
+    jump = np.where(roots, index, tax.parent)
+    dist = (~roots).astype(np.int64)
+    # dist is the distance from each taxon to jump, 0 for the roots
+    while (jump[jump] != jump).any():
+        dist = dist + dist[jump]
+        jump = jump[jump]
+    _depths[id(tax)] = (tax, dist)
+    return dist
+
+
+def rollup(counts, db_name, taxids=None, ranks=None, **kwargs):
+    """given counts of taxa (e.g. reads assigned to each taxid), return the
+    cumulative count of the clade of each of their ancestors: the count of a
+    taxon plus the counts of all its descendants. Counts are added up the
+    tree in one bottom-up pass, level by level from the deepest taxa.
+
+    Arguments:
+    counts -- a dict mapping taxids to counts, or an array of counts aligned
+        with taxids: one dimensional, or a matrix with one column per sample
+    db_name -- the path to the database to query
+    taxids -- the taxids of the rows of counts, if it is an array
+    ranks -- optional list of ranks (e.g. ['genus', 'species']): only return
+        the clades at these ranks
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    Returns a dict mapping taxids to clade counts if counts is a dict, else a
+    tuple of the taxids of the clades and of their counts (one row per
+    clade, one column per sample). Taxids not in the database are ignored.
+    """
+    np = arrays._numpy()
+    if isinstance(counts, dict):
+        clades, totals = rollup(np.array(list(counts.values())), db_name,
+                                list(counts), ranks, **kwargs)
+        return dict(zip(clades.tolist(), totals.tolist()))
+    return _rollup(arrays.taxonomy(db_name, **kwargs), np.asarray(counts),
+                   taxids, ranks)
+
+
+def _rollup(tax, counts, taxids, ranks):
+    """Roll counts up a Taxonomy, see rollup"""
+    np = arrays._numpy()
+    depths = depth(tax)
+    idx = arrays._index(tax.taxid, taxids)
+    found = idx != arrays.MISSING
+    idx, counts = idx[found], counts[found]
+
+    # the clades to count: the taxa and all their ancestors
+    marked = np.zeros(len(tax.taxid), dtype=bool)
+    marked[idx] = True
+    frontier = np.unique(idx)
+    while len(frontier):
+        parents = tax.parent[frontier]
+        parents = parents[parents != arrays.MISSING]
+        frontier = np.unique(parents[~marked[parents]])
+        marked[frontier] = True
+    clades = np.flatnonzero(marked)
+
+    # the same tree, restricted to the clades
+    position = np.full(len(tax.taxid), arrays.MISSING, dtype=np.int64)
+    position[clades] = np.arange(len(clades))
+    parent = tax.parent[clades]
+    parent = np.where(parent == arrays.MISSING, arrays.MISSING,
+                      position[parent])
+    level = depths[clades]
+
+    totals = np.zeros((len(clades),) + counts.shape[1:], dtype=counts.dtype)
+    np.add.at(totals, position[idx], counts)
+    order = np.argsort(-level, kind='mergesort')
+    bounds = np.flatnonzero(np.diff(level[order])) + 1
+    for nodes in np.split(order, bounds):
+        nodes = nodes[(parent[nodes] != arrays.MISSING) &
+                      (parent[nodes] != nodes)]
+        np.add.at(totals, parent[nodes], totals[nodes])
+
+    if ranks is not None:
+        keep = np.isin(tax.ranks[tax.rank[clades]], list(ranks))
+        clades, totals = clades[keep], totals[keep]
+    return tax.taxid[clades], totals
+
+
+def rollup_file(input_file, output_file, db_name, ranks=None, **kwargs):
+    """Roll up a tab separated table of counts: one row per taxon, its taxid
+    in the first column, then one column of counts per sample. A first line
+    whose first column is not a taxid is read as the names of the samples.
+    The output has one row per clade: taxid, rank, scientific name and the
+    clade count of each sample, with a header line.
+
+    Arguments:
+    input_file -- the table of counts
+    output_file -- the table of clade counts
+    db_name -- the path to the database to query
+    ranks -- optional list of ranks of the clades to write
+    kwargs -- Extra options for non sqlite database type (e.g.: dbtype/username/password)
+    Returns the number of clades written
+    """
+    np = arrays._numpy()
+    samples = None
+    taxids, rows = [], []
+    with open(input_file) as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+            if not line.strip():
+                continue
+            if samples is None and not taxids and not fields[0].isdigit():
+                samples = fields[1:]
+                continue
+            taxids.append(int(fields[0]))
+            rows.append([float(v) if '.' in v else int(v) for v in fields[1:]])
+    counts = np.array(rows).reshape(len(rows), -1)
+    if samples is None:
+        samples = ['count%d' % (i + 1) for i in range(counts.shape[1])]
+    tax = arrays.taxonomy(db_name, **kwargs)
+    clades, totals = _rollup(tax, counts, taxids, ranks)
+    idx = arrays._index(tax.taxid, clades)
+    with open(output_file, 'w') as out:
+        out.write('\t'.join(['taxid', 'rank', 'name'] + samples) + '\n')
+        for taxid, i, total in zip(clades.tolist(), idx.tolist(),
+                                   totals.tolist()):
+            out.write('\t'.join([str(taxid), tax.ranks[tax.rank[i]],
+                                 tax.names[tax.name[i]]] +
+                                [str(v) for v in total]) + '\n')
+    return len(clades)
@@ -2,10 +2,18 @@
 # -*- coding: utf-8 -*-
 
 import peewee as pw
+import itertools
+import os
 import sys
+import urllib.parse
 
 db = pw.Proxy()
 
+# number of rows fetched at a time by stream
+FETCH_SIZE = 10000
+
+_cursor_names = itertools.count()
+
 
 class BaseModel(pw.Model):
     class Meta:
@@ -92,6 +100,77 @@ class Prot(BaseModel):
     accession = pw.CharField(null=False, index=True)
 
 
+class AccessionPrefix(BaseModel):
+    """table AccessionPrefix. Each row routes an accession prefix to a
+    sequence table containing accession numbers starting with it.
+
+    Fields:
+    prefix -- the leading letters of accession numbers (e.g.: X, XP_, AAAA)
+    division -- the name of the sequence table (e.g.: gb)
+    """
+    prefix = pw.CharField(null=False, index=True)
+    division = pw.CharField(null=False)
+
+
+class Shards(BaseModel):
+    """table Shards. Each row is a sequence table of a sqlite database whose
+    rows are spread over shard files (see taxadb.shard).
+
+    Fields:
+    division -- the name of the sequence table (e.g.: gb)
+    count -- the number of shard files
+    """
+    division = pw.CharField(null=False, primary_key=True)
+    count = pw.IntegerField(null=False)
+
+
+SEQUENCE_TABLES = [Est, Gb, Gss, Wgs, Prot]
+
+
+def stream(query, fetch_size=FETCH_SIZE):
+    """Execute a select query and return an iterator on its rows as tuples,
+    straight from the database cursor, without building model instances or
+    caching the rows. On PostgreSQL and MySQL the query runs on a server-side
+    cursor (a named cursor with psycopg2, a SSCursor with PyMySQL), so that
+    the client holds at most fetch_size rows at a time.
+
+    A MySQL connection cannot run another query until a SSCursor has been
+    read to the end: do not query the database while iterating on a stream.
+
+    Arguments:
+    query -- a select query on the initialized database
+    fetch_size -- number of rows fetched from the server at a time
+    """
+    database = db.obj
+    sql, params = query.sql()
+    if isinstance(database, pw.PostgresqlDatabase):
+        # named cursors only live in a transaction, which psycopg2 opens
+        cursor = database.get_conn().cursor(
+            name='taxadb_stream_%d' % next(_cursor_names))
+        cursor.itersize = fetch_size
+    elif isinstance(database, pw.MySQLDatabase):
+        import pymysql.cursors
+        cursor = database.get_conn().cursor(pymysql.cursors.SSCursor)
+    else:
+        cursor = database.get_cursor()
+    with database.exception_wrapper():
+        cursor.execute(sql, params or ())
+    return _fetch(cursor, fetch_size)
+
+
+def _fetch(cursor, fetch_size):
+    """Yield the rows of an executed cursor, fetch_size at a time"""
+    try:
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cursor.close()
+
+
 class DatabaseFactory(object):
     """Databas factory to support multiple database type"""
 
@@ -102,7 +181,9 @@ class DatabaseFactory(object):
         :type dbname: str
         :param dbtype: Database type
         :type dbtype: str
-        :param kwargs: Keyword arguments
+        :param kwargs: Keyword arguments. For sqlite, readonly=True opens the
+            database with the read-only profile (see get_database), tuned by
+            mmap_size (bytes) and cache_size (KiB)
         :type kwargs: dict
         """
         if not dbname:
@@ -122,6 +203,8 @@ class DatabaseFactory(object):
         :return:
         """
         if self.dbtype == 'sqlite':
+            if self.args.get('readonly'):
+                return self._readonly_sqlite()
             return pw.SqliteDatabase(self.dbname)
         else:
             if 'username' not in self.args or 'password' not in self.args:
@@ -136,3 +219,41 @@ class DatabaseFactory(object):
             elif self.dbtype == 'postgres':
                 return pw.PostgresqlDatabase(self.dbname, user=self.args['username'], password=self.args['password'],
                                              host=self.args['hostname'])
+
+    def _readonly_sqlite(self):
+        """
+        Returns a sqlite database opened for many concurrent readers: the file
+        is opened read-only (mode=ro), memory mapped (mmap_size) so that
+        processes share the OS page cache, and query_only forbids writes.
+        Databases not in WAL mode are also opened with immutable=1, which
+        skips file locking entirely; they must not be modified while opened.
+
+        :return:
+        """
+        uri = 'file:%s?mode=ro' % urllib.parse.quote(
+            os.path.abspath(self.dbname))
+        if not _sqlite_wal(self.dbname):
+            uri += '&immutable=1'
+        pragmas = [
+            ('mmap_size', int(self.args.get('mmap_size') or 1 << 34)),
+            ('cache_size', -int(self.args.get('cache_size') or 65536)),
+            ('query_only', 1),
+        ]
+        return pw.SqliteDatabase(uri, pragmas=pragmas, uri=True)
+
+
+def _sqlite_wal(dbname):
+    """Return True if a sqlite database is in WAL mode
+
+    The read and write format versions of the file header (bytes 18 and 19)
+    are 2 for WAL databases and 1 for rollback journal databases.
+
+    Arguments:
+    dbname -- path to the sqlite database
+    """
+    if not os.path.exists(dbname):
+        print('[ERROR] %s does not exist' % dbname, file=sys.stderr)
+        sys.exit(1)
+    with open(dbname, 'rb') as f:
+        header = f.read(20)
+    return header[18:20] == b'\x02\x02'
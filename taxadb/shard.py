@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import zlib
+
+from taxadb.schema import *
+
+
+def index(accession, n):
+    """Return the shard (0 to n - 1) of an accession number
+
+    Arguments:
+    accession -- an accession number
+    n -- number of shards
+    """
+    return zlib.crc32(accession.encode()) % n
+
+
+def path(db_name, division, i):
+    """Return the path of a shard file of a sqlite database
+
+    Arguments:
+    db_name -- the path to the database
+    division -- the name of the sequence table (e.g.: gb)
+    i -- the shard
+    """
+    return '%s.%s.%d' % (db_name, division, i)
+
+
+def count(table):
+    """Return the number of shard files of a sequence table of the connected
+    database, 0 if its rows are in the database itself
+
+    Arguments:
+    table -- the sequence table
+    """
+    if not Shards.table_exists():
+        return 0
+    row = Shards.select().where(
+        Shards.division == table._meta.db_table).first()
+    return row.count if row is not None else 0
+
+
+def create(table, n):
+    """Create a sequence table spread over n shards. On PostgreSQL, the table
+    is partitioned by a hash of the accession numbers, and rows are inserted
+    and looked up as usual. On sqlite, each shard is a separate file next to
+    the database, and the table created in the database stays empty: rows
+    must be inserted with a Writer, and are looked up with lookup.
+
+    Arguments:
+    table -- the sequence table
+    n -- number of shards
+    Throws `SystemExit` for MySQL databases
+    """
+    name = table._meta.db_table
+    if isinstance(db.obj, pw.PostgresqlDatabase):
+        # a partitioned table cannot have a primary key without the partition
+        # key, hence this DDL instead of the one of the model
+        db.execute_sql(
+            'CREATE TABLE "%s" ("primary" SERIAL NOT NULL, '
+            '"taxid_id" INTEGER NOT NULL REFERENCES "taxa" ("ncbi_taxid"), '
+            '"accession" VARCHAR(255) NOT NULL) '
+            'PARTITION BY HASH ("accession")' % name)
+        for i in range(n):
+            db.execute_sql(
+                'CREATE TABLE "%s_%d" PARTITION OF "%s" '
+                'FOR VALUES WITH (MODULUS %d, REMAINDER %d)' % (
+                    name, i, name, n, i))
+    elif isinstance(db.obj, pw.SqliteDatabase):
+        db.create_table(table)
+        if not Shards.table_exists():
+            db.create_table(Shards)
+        Shards.delete().where(Shards.division == name).execute()
+        Shards.insert(division=name, count=n).execute()
+    else:
+        print('[ERROR] sharding is supported for sqlite and postgres',
+              file=sys.stderr)
+        sys.exit(1)
+
+
+class Writer(object):
+    """Insert the rows of a sequence table in its sqlite shard files, each in
+    a single transaction, committed by close"""
+
+    def __init__(self, table, n, db_name):
+        self.table = table
+        self.databases = []
+        for i in range(n):
+            shard_path = path(db_name, table._meta.db_table, i)
+            if os.path.exists(shard_path):
+                os.remove(shard_path)  # shard of a previous build
+            database = pw.SqliteDatabase(shard_path)
+            database.connect()
+            database.create_table(table)
+            # peewee opens sqlite in autocommit mode (isolation_level=None):
+            # without an explicit BEGIN, every insert would be committed
+            database.set_autocommit(False)
+            database.execute_sql('BEGIN')
+            self.databases.append(database)
+
+    def insert(self, rows):
+        """Insert rows (a list of dicts, as for insert_many) in their shards"""
+        shards = {}
+        for row in rows:
+            shards.setdefault(index(row['accession'], len(self.databases)),
+                              []).append(row)
+        for i, shard_rows in shards.items():
+            self.databases[i].execute_sql(
+                *self.table.insert_many(shard_rows).sql())
+
+    def close(self):
+        """Index and commit the shards"""
+        for database in self.databases:
+            database.create_index(self.table, ['accession'], unique=True)
+            database.commit()
+            database.close()
+
+
+class Reader(object):
+    """Look up accession numbers in the sqlite shard files of a sequence
+    table, in parallel threads (one per shard). Each shard is opened once,
+    and read by one thread at a time, until close."""
+
+    def __init__(self, table, n, db_name, **kwargs):
+        self.table = table
+        self.databases = []
+        for i in range(n):
+            database = DatabaseFactory(
+                dbname=path(db_name, table._meta.db_table, i),
+                **kwargs).get_database()
+            # the connection is opened here and used by the threads of the
+            # pool, never by two threads at once
+            database.connect_kwargs['check_same_thread'] = False
+            database.connect()
+            self.databases.append(database)
+        self.pool = None
+        if n > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            self.pool = ThreadPoolExecutor(n)
+
+    def batches(self, acc_number_list, chunk):
+        """Split accession numbers by shard, then each shard in chunks. Yield
+        batches holding at most one chunk of each shard, as dicts mapping a
+        shard to its chunk.
+
+        Arguments:
+        acc_number_list -- a list of accession numbers
+        chunk -- the maximum number of accession numbers per query
+        """
+        n = len(self.databases)
+        shards = [[] for _ in range(n)]
+        crc32 = zlib.crc32
+        for acc in acc_number_list:
+            shards[crc32(acc.encode()) % n].append(acc)  # index, inlined
+        for i in range(0, max(map(len, shards)), chunk):
+            yield {shard: accessions[i:i + chunk]
+                   for shard, accessions in enumerate(shards)
+                   if len(accessions) > i}
+
+    def lookup(self, batch):
+        """Look up a batch (see batches), one query per shard in parallel.
+        Returns a list of (accession number, taxid) tuples"""
+        if self.pool is None or len(batch) < 2:
+            return [row for item in batch.items() for row in self._query(item)]
+        return [row for rows in self.pool.map(self._query, batch.items())
+                for row in rows]
+
+    def _query(self, item):
+        """Look up the accession numbers of a shard"""
+        shard, accessions = item
+        query = self.table.select(self.table.accession, self.table.taxid).where(
+            self.table.accession << accessions)
+        return self.databases[shard].get_conn().execute(
+            *query.sql()).fetchall()
+
+    def close(self):
+        """Stop the threads and close the shards"""
+        if self.pool is not None:
+            self.pool.shutdown()
+        for database in self.databases:
+            database.close()
+
+
+def lookup(table, n, acc_number_list, db_name, chunk, **kwargs):
+    """given a list of accession numbers, look them up in the shard files of
+    a sqlite sequence table, in parallel threads (one per shard)
+
+    Arguments:
+    table -- the sequence table
+    n -- number of shards
+    acc_number_list -- a list of accession numbers
+    db_name -- the path to the database
+    chunk -- the maximum number of accession numbers per query
+    kwargs -- Extra options to open the shards (e.g.: dbtype/readonly)
+    Returns a list of (accession number, taxid) tuples
+    """
+    reader = Reader(table, n, db_name, **kwargs)
+    try:
+        return [row for batch in reader.batches(acc_number_list, chunk)
+                for row in reader.lookup(batch)]
+    finally:
+        reader.close()
+
+
+def rows(table, n, db_name):
+    """Yield the (accession number, taxid) of every row of a sqlite sequence
+    table, shard after shard
+
+    Arguments:
+    table -- the sequence table
+    n -- number of shards
+    db_name -- the path to the database
+    """
+    for i in range(n):
+        database = pw.SqliteDatabase(path(db_name, table._meta.db_table, i))
+        database.connect()
+        try:
+            query = table.select(table.accession, table.taxid)
+            for row in database.execute_sql(*query.sql()):
+                yield row
+        finally:
+            database.close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+from collections import namedtuple
+
+from taxadb import util
+
+# format of the snapshot directory
+VERSION = 2
+
+# the arrays of the taxonomy, as the fields of arrays.Taxonomy
+FIELDS = ['taxid', 'parent', 'rank', 'name']
+
+Snapshot = namedtuple('Snapshot', ['taxonomy', 'accessions', 'taxids',
+                                   'table'])
+Snapshot.__doc__ = """The lookup structures of a database, memory mapped
+
+Fields:
+taxonomy -- dict of the fields of an arrays.Taxonomy
+accessions -- the hot accession numbers (bytes), sorted
+taxids -- the taxid of each hot accession number
+table -- the name of the table the hot accession numbers were looked up
+    in, None if they were routed by prefix
+"""
+
+_loaded = {}
+
+
+class Strings(object):
+    """Read-only array of strings, stored as the concatenation of their utf-8
+    encodings and the offsets of each string in it"""
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        import numpy as np
+        if np.ndim(i) == 0:
+            i = int(i) % len(self)
+            return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode()
+        i = np.asarray(i)
+        return np.array([self[j] for j in i.ravel()],
+                        dtype=object).reshape(i.shape)
+
+
+def path(db_name, **kwargs):
+    """Return the default snapshot directory of a database: next to sqlite
+    databases, in util.CACHE_DIR for other database types (see
+    util.database_file)
+
+    Arguments:
+    db_name -- the path to (or name of) the database
+    kwargs -- the options of the database (dbtype/hostname/port)
+    """
+    return util.database_file(db_name, 'snapshot', **kwargs)
+
+
+def source(db_name, **kwargs):
+    """Identify the state of a database: the size and modification time of a
+    sqlite database file, the largest keys of the tables of other database
+    types (see fingerprint)
+
+    Arguments:
+    db_name -- the path to (or name of) the database
+    kwargs -- the options of the database (e.g.: dbtype/username/password)
+    """
+    if kwargs.get('dbtype') == 'sqlite':
+        stat = os.stat(db_name)
+        return [stat.st_size, stat.st_mtime]
+    from taxadb import schema  # only needed to query database servers
+    database = schema.DatabaseFactory(dbname=db_name, **kwargs).get_database()
+    schema.db.initialize(database)
+    schema.db.connect()
+    try:
+        return fingerprint()
+    finally:
+        schema.db.close()
+
+
+def fingerprint():
+    """Return the largest key of Taxa and of each sequence table of the
+    connected database (None for missing or empty tables), which changes
+    when rows are inserted or tables are rebuilt. Each is read from the
+    index of the primary key.
+    """
+    from taxadb import schema
+    tables = schema.db.get_tables()
+    keys = []
+    for table in [schema.Taxa] + schema.SEQUENCE_TABLES:
+        key = None
+        if table._meta.db_table in tables:
+            key = table.select(
+                schema.pw.fn.MAX(table._meta.primary_key)).scalar()
+        keys.append(key)
+    return keys
+
+
+def write(snapshot_dir, taxonomy, accessions, taxids, db_source=None,
+          table=None):
+    """Write a snapshot directory of .npy files. It is written aside then
+    renamed, so that processes which mapped a previous snapshot keep reading
+    it.
+
+    Arguments:
+    snapshot_dir -- the snapshot directory
+    taxonomy -- dict of the fields of an arrays.Taxonomy
+    accessions -- array of the hot accession numbers, sorted
+    taxids -- array of the taxid of each hot accession number
+    db_source -- the state of the database, from source
+    table -- the name of the table of the hot accession numbers, None if
+        they were routed by prefix
+    """
+    import numpy as np
+    tmpdir = snapshot_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmpdir, ignore_errors=True)
+    os.makedirs(tmpdir)
+    for field in FIELDS:
+        np.save(os.path.join(tmpdir, field + '.npy'), taxonomy[field])
+    names = [str(name).encode() for name in taxonomy['names']]
+    offsets = np.zeros(len(names) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(name) for name in names])
+    np.save(os.path.join(tmpdir, 'names.npy'),
+            np.frombuffer(b''.join(names), dtype=np.uint8))
+    np.save(os.path.join(tmpdir, 'names_offsets.npy'), offsets)
+    np.save(os.path.join(tmpdir, 'accessions.npy'),
+            np.asarray(accessions).astype(bytes))
+    np.save(os.path.join(tmpdir, 'accession_taxids.npy'),
+            np.asarray(taxids, dtype=np.int64))
+    with open(os.path.join(tmpdir, 'meta.json'), 'w') as f:
+        json.dump({'version': VERSION, 'source': db_source, 'table': table,
+                   'ranks': [str(rank) for rank in taxonomy['ranks']]}, f)
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.rename(tmpdir, snapshot_dir)
+
+
+def _load_array(np, array_path):
+    try:
+        return np.load(array_path, mmap_mode='r')
+    except ValueError:  # empty arrays cannot be mapped
+        return np.load(array_path)
+
+
+def load(snapshot_dir):
+    """Load a snapshot written by write, with mmap
+
+    Arguments:
+    snapshot_dir -- the snapshot directory
+    """
+    import numpy as np
+    with open(os.path.join(snapshot_dir, 'meta.json')) as f:
+        meta = json.load(f)
+    array = {}
+    for name in FIELDS + ['names', 'names_offsets', 'accessions',
+                          'accession_taxids']:
+        array[name] = _load_array(np, os.path.join(snapshot_dir, name + '.npy'))
+    taxonomy = {field: array[field] for field in FIELDS}
+    taxonomy['ranks'] = np.array(meta['ranks'], dtype=object)
+    taxonomy['names'] = Strings(array['names'], array['names_offsets'])
+    return Snapshot(taxonomy=taxonomy, accessions=array['accessions'],
+                    taxids=array['accession_taxids'], table=meta['table'])
+
+
+def get(db_name, **kwargs):
+    """Return the snapshot of a database, or None if there is none, or if
+    the database was modified since (see source). Snapshots are loaded once
+    per process.
+
+    Arguments:
+    db_name -- the path to (or name of) the database
+    kwargs -- the options of the database. A snapshot option overrides the
+        snapshot directory, and disables snapshots if False
+    """
+    snapshot_dir = kwargs.get('snapshot', None)
+    if snapshot_dir is False:
+        return None
+    snapshot_dir = os.path.abspath(snapshot_dir or path(db_name, **kwargs))
+    try:
+        mtime = os.path.getmtime(os.path.join(snapshot_dir, 'meta.json'))
+    except OSError:
+        return None
+    cached = _loaded.get(snapshot_dir)
+    if cached is None or cached[0] != mtime:
+        with open(os.path.join(snapshot_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        snap = load(snapshot_dir) if meta['version'] == VERSION else None
+        cached = (mtime, meta['source'], snap)
+        _loaded[snapshot_dir] = cached
+    db_source = cached[1]
+    if db_source is not None and db_source != source(db_name, **kwargs):
+        return None  # stale
+    return cached[2]
@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 from taxadb.schema import *
+from taxadb import metrics
 
 
 def sci_name(taxid, db_name, **kwargs):
@@ -21,7 +22,9 @@ def sci_name(taxid, db_name, **kwargs):
     database = DatabaseFactory(dbname=db_name, **kwargs).get_database()
     db.initialize(database)
     db.connect()
-    name = Taxa.get(Taxa.ncbi_taxid == taxid).tax_name
+    with metrics.timer('taxid.sci_name', 'latency'):
+        name = Taxa.get(Taxa.ncbi_taxid == taxid).tax_name
+    metrics.count('taxid.queries')
     db.close()
     return name
 
@@ -45,16 +48,19 @@ def lineage_id(taxid, db_name, **kwargs):
     db.initialize(database)
     db.connect()
     lineage_list = []
-    current_lineage = Taxa.get(Taxa.ncbi_taxid == taxid).tax_name
-    current_lineage_id = Taxa.get(Taxa.ncbi_taxid == taxid).ncbi_taxid
-    parent = Taxa.get(Taxa.ncbi_taxid == taxid).parent_taxid
-    while current_lineage != 'root':
-        lineage_list.append(current_lineage_id)
-        new_query = Taxa.get(Taxa.ncbi_taxid == parent)
+    with metrics.timer('taxid.lineage_id', 'latency'):
+        current_lineage = Taxa.get(Taxa.ncbi_taxid == taxid).tax_name
+        current_lineage_id = Taxa.get(Taxa.ncbi_taxid == taxid).ncbi_taxid
+        parent = Taxa.get(Taxa.ncbi_taxid == taxid).parent_taxid
+        metrics.count('taxid.queries', 3)
+        while current_lineage != 'root':
+            lineage_list.append(current_lineage_id)
+            new_query = Taxa.get(Taxa.ncbi_taxid == parent)
+            metrics.count('taxid.queries')
 
-        current_lineage = new_query.tax_name
-        current_lineage_id = new_query.ncbi_taxid
-        parent = new_query.parent_taxid
+            current_lineage = new_query.tax_name
+            current_lineage_id = new_query.ncbi_taxid
+            parent = new_query.parent_taxid
     return lineage_list
     db.close()
 
@@ -77,13 +83,16 @@ def lineage_name(taxid, db_name, **kwargs):
     db.initialize(database)
     db.connect()
     lineage_list = []
-    current_lineage = Taxa.get(Taxa.ncbi_taxid == taxid).tax_name
-    parent = Taxa.get(Taxa.ncbi_taxid == taxid).parent_taxid
-    while current_lineage != 'root':
-        lineage_list.append(current_lineage)
-        new_query = Taxa.get(Taxa.ncbi_taxid == parent)
+    with metrics.timer('taxid.lineage_name', 'latency'):
+        current_lineage = Taxa.get(Taxa.ncbi_taxid == taxid).tax_name
+        parent = Taxa.get(Taxa.ncbi_taxid == taxid).parent_taxid
+        metrics.count('taxid.queries', 2)
+        while current_lineage != 'root':
+            lineage_list.append(current_lineage)
+            new_query = Taxa.get(Taxa.ncbi_taxid == parent)
+            metrics.count('taxid.queries')
 
-        current_lineage = new_query.tax_name
-        parent = new_query.parent_taxid
+            current_lineage = new_query.tax_name
+            parent = new_query.parent_taxid
     return lineage_list
     db.close()
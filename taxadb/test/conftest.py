@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import gzip
+import hashlib
+import io
+import os
+import tarfile
+
+import pytest
+
+from taxadb.schema import *
+from taxadb import app
+
+# (taxid, parent taxid, scientific name, rank) of the taxa of the test
+# databases and dumps
+TAXA = [
+    (1, 1, 'root', 'no rank'),
+    (2, 1, 'Bacteria', 'superkingdom'),
+    (3, 2, 'Escherichia coli', 'species')]
+
+# rows per insert, within the variable limit of any SQLite version
+CHUNK = 400
+
+
+@pytest.fixture
+def make_db(tmp_path):
+    """Factory building a sqlite database in tmp_path, which returns the path
+    to the database.
+
+    Arguments of the factory:
+    tables -- optional dict of the rows (dicts) of each table to create, e.g.
+        {Gb: [{'accession': 'X1', 'taxid': 2}]}
+    taxa -- the rows of Taxa, as (taxid, parent, name, rank) tuples, default
+        TAXA. None to not create the Taxa table
+    name -- the name of the database file
+    """
+    def make_db(tables=None, taxa=TAXA, name='taxadb.sqlite'):
+        dbname = str(tmp_path / name)
+        database = DatabaseFactory(dbname=dbname, dbtype='sqlite').get_database()
+        db.initialize(database)
+        db.connect()
+        rows = {}
+        if taxa is not None:
+            rows[Taxa] = [{'ncbi_taxid': taxid, 'parent_taxid': parent,
+                           'tax_name': name, 'lineage_level': rank}
+                          for taxid, parent, name, rank in taxa]
+        rows.update(tables or {})
+        with db.atomic():
+            for table, table_rows in rows.items():
+                db.create_table(table)
+                for i in range(0, len(table_rows), CHUNK):
+                    table.insert_many(table_rows[i:i + CHUNK]).execute()
+        db.close()
+        return dbname
+    return make_db
+
+
+def _gzip(path, lines):
+    with gzip.open(path, 'wt') as f:
+        f.writelines(lines)
+
+
+def _md5(path):
+    with open(path, 'rb') as f, open(path + '.md5', 'w') as out:
+        out.write('%s  %s\n' % (hashlib.md5(f.read()).hexdigest(),
+                                os.path.basename(path)))
+
+
+@pytest.fixture
+def make_dump(tmp_path):
+    """Factory writing a taxdump.tar.gz and accession2taxid files in
+    tmp_path/dump, as 'taxadb download' does, which returns the directory.
+
+    Arguments of the factory:
+    taxa -- the taxa, as (taxid, parent, name, rank) tuples, default TAXA
+    accessions -- optional dict of the (accession, taxid) rows of each
+        accession2taxid file, by file name (e.g. nucl_gb.accession2taxid.gz)
+    synonyms -- optional (taxid, name, name class) rows of names.dmp which
+        are not scientific names
+    mirror -- lay the files out as the ncbi ftp (accession2taxid files in a
+        sub-directory) with their .md5 files, for 'taxadb create --url'
+    """
+    def make_dump(taxa=TAXA, accessions=None, synonyms=(), mirror=False):
+        outdir = tmp_path / 'dump'
+        acc_dir = outdir / 'accession2taxid' if mirror else outdir
+        acc_dir.mkdir(parents=True, exist_ok=True)
+        nodes = ''.join('%s\t|\t%s\t|\t%s\t|\n' % (taxid, parent, rank)
+                        for taxid, parent, name, rank in taxa)
+        names = ''.join('%s\t|\t%s\t|\t\t|\tscientific name\t|\n' % (
+            taxid, name) for taxid, parent, name, rank in taxa)
+        names += ''.join('%s\t|\t%s\t|\t\t|\t%s\t|\n' % synonym
+                         for synonym in synonyms)
+        taxdump = str(outdir / 'taxdump.tar.gz')
+        with tarfile.open(taxdump, 'w:gz') as tar:
+            for name, content in [('names.dmp', names), ('nodes.dmp', nodes)]:
+                data = content.encode()
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        paths = [taxdump]
+        for acc_file, rows in (accessions or {}).items():
+            path = str(acc_dir / acc_file)
+            _gzip(path, ['accession\taccession.version\ttaxid\tgi\n'] + [
+                '%s\t%s.1\t%s\t%d\n' % (acc, acc, taxid, i)
+                for i, (acc, taxid) in enumerate(rows)])
+            paths.append(path)
+        if mirror:
+            for path in paths:
+                _md5(path)
+        return str(outdir)
+    return make_dump
+
+
+@pytest.fixture
+def create_db(tmp_path):
+    """Factory running 'taxadb create' (division gb, in chunks of 3 rows) to
+    a sqlite database in tmp_path, which returns the path to the database.
+
+    Arguments of the factory:
+    name -- the name of the database file
+    kwargs -- the other options of 'taxadb create' (e.g. input, url,
+        pipeline, include_taxa)
+    """
+    def create_db(name='created.sqlite', **kwargs):
+        dbname = str(tmp_path / name)
+        options = dict(dbtype='sqlite', division='gb', chunk=3,
+                       hostname='localhost', username=None, password=None,
+                       port=None)
+        options.update(kwargs)
+        app.create_db(argparse.Namespace(dbname=dbname, **options))
+        return dbname
+    return create_db
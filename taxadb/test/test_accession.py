@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import itertools
+import sqlite3
+
 from taxadb.schema import *
 
 from taxadb import accession
+from taxadb import metrics
 
 
 def test_taxid():
@@ -16,6 +20,47 @@ def test_taxid():
         assert taxon[1] == 9646
 
 
+def test_taxid_routed(make_db):
+    # AccessionPrefix routes X to gb and XP_ to prot. X1 is also in prot,
+    # where it must not be looked up
+    dbname = make_db({
+        Gb: [{'accession': 'X1', 'taxid': 2}, {'accession': 'X2', 'taxid': 2}],
+        Prot: [{'accession': 'XP_1', 'taxid': 3},
+               {'accession': 'X1', 'taxid': 3}],
+        AccessionPrefix: [{'prefix': 'X', 'division': 'gb'},
+                          {'prefix': 'XP_', 'division': 'prot'}]})
+    collector = metrics.add_hook(metrics.Collector())
+    try:
+        taxids = list(accession.taxid(
+            ['X1', 'XP_1', 'X2', 'Y1'], dbname, dbtype='sqlite'))
+    finally:
+        metrics.remove_hook(collector)
+    assert sorted(taxids) == [('X1', 2), ('X2', 2), ('XP_1', 3)]
+    # one query per routed table: Y has no table, and X1 is not looked up
+    # in prot
+    assert collector.counters['accession.queries'] == 2
+
+
+def test_route_many_prefixes(make_db):
+    # WGS projects each have their own prefix: more prefixes than the
+    # variable limit of SQLite before 3.32
+    prefixes = [''.join(p) for p in itertools.product('ABCDEFGHIJ', repeat=4)]
+    dbname = make_db({
+        Wgs: [],
+        AccessionPrefix: [{'prefix': p, 'division': 'wgs'}
+                          for p in prefixes[:1500]]})
+    database = DatabaseFactory(dbname=dbname, dbtype='sqlite').get_database()
+    db.initialize(database)
+    db.connect()
+    db.get_conn().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    try:
+        routes = list(accession._route(
+            None, [p + '01000001' for p in prefixes[:2000]]))
+    finally:
+        db.close()
+    assert [(table, len(accs)) for table, accs in routes] == [(Wgs, 1500)]
+
+
 def test_sci_name():
     sci_name = accession.sci_name(
         ['Z12029'],
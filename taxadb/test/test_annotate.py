@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from taxadb.schema import *
+
+from taxadb import annotate
+from taxadb import metrics
+
+# root, and the taxon of X17276
+TAXA = [(1, 1, 'root', 'no rank'),
+        (9646, 1, 'Ailuropoda melanoleuca', 'species')]
+
+
+def _write(tmp_path, lines):
+    path = str(tmp_path / 'hits.tsv')
+    with open(path, 'w') as f:
+        f.writelines(lines)
+    return path
+
+
+def test_shards(tmp_path):
+    path = _write(tmp_path, ['line%d\n' % i for i in range(100)])
+    ranges = annotate.shards(path, 7)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == os.path.getsize(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    for start, end in ranges:
+        assert start == 0 or data[start - 1:start] == b'\n'
+    assert [s for s, _ in ranges[1:]] == [e for _, e in ranges[:-1]]
+
+
+def test_annotate(tmp_path, make_db):
+    dbname = make_db({Gb: [{'accession': 'X17276', 'taxid': 9646}]}, TAXA)
+    path = _write(tmp_path,
+                  ['q%d\tX17276.1\t99.0\n' % i for i in range(10)] +
+                  ['q10\tNOT_AN_ACCESSION\t99.0\n'])
+    output = path + '.out'
+    for batch_size in [annotate.BATCH_SIZE, 3]:
+        lines = annotate.annotate(
+            path, output, dbname, Gb, field='taxid', processes=2,
+            batch_size=batch_size, dbtype='sqlite')
+        assert lines == 11
+        with open(output) as f:
+            annotated = f.read().splitlines()
+        assert annotated[0] == 'q0\tX17276.1\t99.0\t9646'
+        assert annotated[-1] == 'q10\tNOT_AN_ACCESSION\t99.0\tNA'
+
+
+def test_lineage_memo(tmp_path, make_db):
+    dbname = make_db({Gb: [{'accession': 'X%d' % i, 'taxid': 3}
+                           for i in range(4)]})
+    path = _write(tmp_path, ['q%d\tX%d\n' % (i, i) for i in range(4)])
+    annotate._init_worker(dbname, {'dbtype': 'sqlite'})
+    job = (path, 0, os.path.getsize(path), path + '.shard', dbname, Gb,
+           'lineage_name', 2, '\t', True, 2, {'dbtype': 'sqlite'})
+    collector = metrics.add_hook(metrics.Collector())
+    try:
+        assert annotate._annotate_shard(job) == (path + '.shard', 4)
+    finally:
+        metrics.remove_hook(collector)
+        db.close()
+    with open(path + '.shard') as f:
+        assert f.read().splitlines() == [
+            'q%d\tX%d\tEscherichia coli;Bacteria' % (i, i) for i in range(4)]
+    # one query per batch of 2 lines, and 2 for the ancestors of taxid 3,
+    # which are only read by the first batch
+    assert collector.counters['accession.queries'] == 2 + 2
+
+
+def test_annotate_missing_table(tmp_path, make_db):
+    # run in a separate process, as a hung pool would never return
+    path = _write(tmp_path, ['q0\tX17276.1\t99.0\n'])
+    dbname = make_db(taxa=None)
+    script = ('from taxadb import annotate\n'
+              'from taxadb.schema import Gb\n'
+              'annotate.annotate(%r, %r, %r, Gb, processes=1, '
+              'dbtype="sqlite")\n' % (path, path + '.out', dbname))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    result = subprocess.run([sys.executable, '-c', script], env=env,
+                            stderr=subprocess.PIPE, timeout=60)
+    assert result.returncode == 1
+    assert b'Table gb does not exist' in result.stderr
+
+
+def test_worker_exit(tmp_path, make_db):
+    dbname = make_db(taxa=None)
+    path = _write(tmp_path, ['q0\tX17276.1\t99.0\n'])
+    job = (path, 0, os.path.getsize(path), path + '.shard', dbname, Gb,
+           'taxid', 2, '\t', True, 1, {'dbtype': 'sqlite'})
+    annotate._init_worker(dbname, {'dbtype': 'sqlite'})
+    with pytest.raises(Exception) as error:
+        annotate._annotate_shard(job)
+    db.close()
+    assert error.type is Exception
+    assert 'SystemExit' in str(error.value)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from taxadb.schema import *
+
+from taxadb import arrays
+
+
+def test_accession_taxid(make_db):
+    dbname = make_db({Gb: [{'accession': 'X17276', 'taxid': 3}]})
+    taxids = arrays.accession_taxid(
+        ['X17276', 'NOT_AN_ACCESSION', 'X17276'], dbname, Gb,
+        dbtype='sqlite')
+    assert taxids.tolist() == [3, arrays.MISSING, 3]
+
+
+def test_taxa(make_db):
+    dbname = make_db()
+    batch = arrays.taxa([3, -5], dbname, dbtype='sqlite')
+    assert batch.taxid.tolist() == [3, arrays.MISSING]
+    assert batch.names[batch.name[0]] == 'Escherichia coli'
+    assert batch.ranks[batch.rank[0]] == 'species'
+    assert batch.parent.tolist() == [2, arrays.MISSING]
+    assert batch.rank[1] == arrays.MISSING
+
+
+def test_cache_key():
+    key = arrays._cache_key('taxadb', dbtype='postgres', hostname='db1')
+    assert key == arrays._cache_key('taxadb', dbtype='postgres',
+                                    hostname='db1', username='reader')
+    assert key != arrays._cache_key('taxadb', dbtype='postgres',
+                                    hostname='db2')
+    assert key != arrays._cache_key('taxadb', dbtype='postgres',
+                                    hostname='db1', port=5433)
+
+
+def test_taxa_empty(make_db):
+    dbname = make_db(taxa=[])
+    batch = arrays.taxa([1, 2], dbname, dbtype='sqlite')
+    assert batch.taxid.tolist() == [arrays.MISSING] * 2
+    assert batch.parent.tolist() == [arrays.MISSING] * 2
+    assert batch.name.tolist() == [arrays.MISSING] * 2
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+from taxadb.bloom import BloomFilter
+from taxadb.schema import Gb
+from taxadb import accession
+from taxadb import bloom
+from taxadb import metrics
+
+
+def test_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    accessions = ['X%05d' % i for i in range(1000)]
+    for acc in accessions:
+        bloom.add(acc)
+    assert len(bloom) == 1000
+    assert all(acc in bloom for acc in accessions)
+
+
+def test_false_positive_rate():
+    bloom = BloomFilter(10000, 0.01)
+    for i in range(10000):
+        bloom.add('X%05d' % i)
+    assert 0.005 < bloom.false_positive_rate() < 0.02
+    false_positives = sum('NC_%06d' % i in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_save_load(tmp_path):
+    bloom = BloomFilter(100)
+    bloom.add('Z12029')
+    path = str(tmp_path / 'test.gb.bloom')
+    bloom.save(path)
+    loaded = BloomFilter.load(path)
+    assert 'Z12029' in loaded
+    assert len(loaded) == 1
+    assert loaded.false_positive_rate() == bloom.false_positive_rate()
+
+
+def test_create_bloom(make_dump, create_db):
+    outdir = make_dump(accessions={'nucl_gb.accession2taxid.gz': [
+        ('X%05d' % i, 2) for i in range(100)]})
+    dbname = create_db('bloom.sqlite', input=outdir, chunk=500, bloom=True,
+                       bloom_error_rate=0.001)
+    assert os.path.exists(dbname + '.gb.bloom')
+    collector = metrics.add_hook(metrics.Collector())
+    try:
+        taxids = list(accession.taxid(['X00042', 'Z99999'], dbname, Gb,
+                                      dbtype='sqlite'))
+        assert list(accession.taxid(['Z99999'], dbname, Gb,
+                                    dbtype='sqlite')) == []
+    finally:
+        metrics.remove_hook(collector)
+    assert taxids == [('X00042', 2)]
+    assert collector.counters['accession.bloom_rejected'] == 2
+    # the second lookup is skipped entirely
+    assert collector.counters['accession.queries'] == 1
+
+
+def test_path():
+    sqlite = bloom.path('taxadb.sqlite', 'gb', dbtype='sqlite')
+    assert sqlite == os.path.abspath('taxadb.sqlite.gb.bloom')
+    postgres = bloom.path('taxadb', 'gb', dbtype='postgres', hostname='db1')
+    assert os.path.isabs(postgres)
+    assert postgres != bloom.path('taxadb', 'gb', dbtype='postgres',
+                                  hostname='db2')
+    assert postgres != bloom.path('taxadb', 'gb', dbtype='mysql',
+                                  hostname='db1')
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+
+from taxadb.schema import *
+from taxadb import accession
+from taxadb import app
+from taxadb import columnar
+
+# 10 gb accessions, of taxids 2 and 3
+GB = [{'accession': 'X%d' % i, 'taxid': 2 + i % 2} for i in range(10)]
+
+
+def _args(**kwargs):
+    return argparse.Namespace(
+        dbtype='sqlite', hostname='localhost', username=None, password=None,
+        port=None, **kwargs)
+
+
+def test_read(tmp_path, make_db):
+    dbname = make_db({Gb: GB})
+    for format in ['parquet', 'arrow']:
+        exported = str(tmp_path / format)
+        app.export(_args(dbname=dbname, outdir=exported, format=format,
+                         batch_size=4))
+        gb = columnar.path(exported, 'gb')
+        assert gb.endswith(columnar.EXTENSIONS[format])
+        chunks = list(columnar.read(gb, 3))
+        assert all(0 < len(c) <= 3 for c in chunks)
+        assert sum(len(c) for c in chunks) == 10
+        assert chunks[0][0] == {'accession': 'X0', 'taxid': 2}
+        assert columnar.path(exported, 'prot') is None
+
+
+def test_round_trip(tmp_path, make_db):
+    source = make_db({Gb: GB})
+    exported = str(tmp_path / 'parquet')
+    app.export(_args(dbname=source, outdir=exported, format='parquet',
+                     batch_size=1000))
+    dbname = str(tmp_path / 'copy.sqlite')
+    app.create_db(_args(dbname=dbname, from_parquet=exported,
+                        division='full', chunk=500))
+    taxids = sorted(accession.taxid(['X0', 'X1', 'Y0'], dbname, Gb,
+                                    dbtype='sqlite'))
+    assert taxids == [('X0', 2), ('X1', 3)]
+    lineages = list(accession.lineage_name(['X1'], dbname, dbtype='sqlite'))
+    assert lineages == [('X1', ['Escherichia coli', 'Bacteria'])]
+
+
+def test_lineage(tmp_path, make_db):
+    # 7 is an orphan: its parent 8 is not in taxa
+    dbname = make_db(taxa=[
+        (1, 1, 'root', 'no rank'), (2, 1, 'Bacteria', 'superkingdom'),
+        (4, 2, 'Escherichia', 'genus'), (3, 4, 'Escherichia coli', 'species'),
+        (5, 3, 'Escherichia coli K-12', 'no rank'),
+        (7, 8, 'orphan', 'species')])
+    exported = str(tmp_path / 'parquet')
+    app.export(_args(dbname=dbname, outdir=exported, format='parquet',
+                     batch_size=2))
+    rows = [row for chunk in columnar.read(columnar.path(exported, 'lineage'),
+                                           10) for row in chunk]
+    lineages = {row['ncbi_taxid']: row['lineage'] for row in rows}
+    assert lineages == {1: [], 2: [2], 4: [4, 2], 3: [3, 4, 2],
+                        5: [5, 3, 4, 2], 7: [7]}
+    species = {row['ncbi_taxid']: row['species'] for row in rows}
+    assert species == {1: None, 2: None, 4: None, 3: 3, 5: 3, 7: 7}
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+from taxadb import metrics
+
+
+def test_disabled():
+    assert not metrics.enabled()
+    with metrics.timer('noop') as t:
+        pass
+    assert t.start is None
+
+
+def test_collector():
+    collector = metrics.add_hook(metrics.Collector())
+    try:
+        metrics.count('rows', 10)
+        metrics.count('rows', 5)
+        with metrics.timer('phase'):
+            pass
+        with metrics.timer('query', 'latency'):
+            pass
+    finally:
+        metrics.remove_hook(collector)
+    assert collector.counters == {'rows': 15}
+    assert 'phase' in collector.phases
+    assert collector.latencies['query']['count'] == 1
+    data = json.loads(collector.to_json())
+    assert data['counters']['rows'] == 15
+    text = collector.to_prometheus()
+    assert 'taxadb_events_total{name="rows"} 15' in text
+    assert 'taxadb_latency_seconds_bucket{name="query",le="+Inf"} 1' in text
+    assert 'taxadb_latency_seconds_count{name="query"} 1' in text
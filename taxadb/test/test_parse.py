@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+
+import pytest
+
+from taxadb import parse
+
+# 1 -> 2 -> (3 -> 5, 4), 1 -> 6
+CLADES = [(1, 1, 'root', 'no rank'), (2, 1, 'Bacteria', 'superkingdom'),
+          (3, 2, 'Escherichia', 'genus'), (4, 2, 'Shigella', 'genus'),
+          (5, 3, 'Escherichia coli', 'species'),
+          (6, 1, 'Archaea', 'superkingdom')]
+# one gb accession per taxon
+GB = [('X%d' % taxid, taxid) for taxid, parent, name, rank in CLADES]
+
+
+def test_taxdump_archive(make_dump):
+    outdir = make_dump(
+        [(1, 1, 'root', 'no rank'), (2, 1, 'Bacteria', 'superkingdom')],
+        synonyms=[(2, 'eubacteria', 'genbank common name')])
+    taxa = parse.taxdump_archive(os.path.join(outdir, 'taxdump.tar.gz'))
+    assert taxa == [
+        {'ncbi_taxid': '1', 'parent_taxid': '1', 'tax_name': 'root',
+         'lineage_level': 'no rank'},
+        {'ncbi_taxid': '2', 'parent_taxid': '1', 'tax_name': 'Bacteria',
+         'lineage_level': 'superkingdom'}]
+
+
+def test_clade():
+    # 1 -> 2 -> (3 -> 5, 4), 1 -> 6
+    nodes = [(1, 1), (2, 1), (3, 2), (4, 2), (5, 3), (6, 1)]
+    members, ancestors = parse.clade(nodes, [2], [3])
+    assert members == {2, 4}
+    assert ancestors == {1}
+    members, ancestors = parse.clade(nodes, [], [2])
+    assert members == {1, 6}
+    assert ancestors == set()
+
+
+def test_accession2taxid_taxids():
+    lines = [b'accession\taccession.version\ttaxid\tgi\n',
+             b'X17276\tX17276.1\t4\t1\n',
+             b'Z12029\tZ12029.1\t5\t2\n']
+    chunks = list(parse.accession2taxid(lines, 500, {2, 4}))
+    assert chunks == [[{'accession': 'X17276', 'taxid': '4'}]]
+
+
+def _built(dbname):
+    conn = sqlite3.connect(dbname)
+    try:
+        taxa = [t for (t,) in conn.execute('SELECT ncbi_taxid FROM taxa')]
+        gb = [t for (t,) in conn.execute('SELECT taxid_id FROM gb')]
+    finally:
+        conn.close()
+    return sorted(taxa), sorted(gb)
+
+
+def test_create_include_taxa(make_dump, create_db):
+    outdir = make_dump(CLADES, {'nucl_gb.accession2taxid.gz': GB})
+    dbname = create_db(input=outdir, include_taxa=[2], exclude_taxa=[3])
+    # the ancestors of the clades are kept in taxa, not their accessions
+    assert _built(dbname) == ([1, 2, 4], [2, 4])
+
+
+def test_create_exclude_taxa(make_dump, create_db):
+    outdir = make_dump(CLADES, {'nucl_gb.accession2taxid.gz': GB})
+    dbname = create_db(input=outdir, include_taxa=None, exclude_taxa=[2])
+    assert _built(dbname) == ([1, 6], [1, 6])
+
+
+def test_create_include_missing(make_dump, create_db, capsys):
+    outdir = make_dump(CLADES, {'nucl_gb.accession2taxid.gz': GB})
+    with pytest.raises(SystemExit):
+        create_db(input=outdir, include_taxa=[99], exclude_taxa=None)
+    assert 'taxid(s) 99 not in the taxonomy' in capsys.readouterr().err
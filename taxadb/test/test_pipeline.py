@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import functools
+import gzip
+import hashlib
+import http.server
+import os
+import pathlib
+import sqlite3
+import threading
+
+import pytest
+
+from taxadb import pipeline
+
+LINES = [b'accession\taccession.version\ttaxid\tgi\n'] + [
+    b'X%05d\tX%05d.1\t9646\t%d\n' % (i, i, i) for i in range(30000)]
+
+# gb accessions of the dumps built by 'taxadb create', of taxids 2 and 3
+GB = [('X%d' % i, 2 + i % 2) for i in range(10)]
+
+
+def _gzipped(tmp_path, md5=True):
+    path = str(tmp_path / 'nucl_gb.accession2taxid.gz')
+    with gzip.open(path, 'wb') as f:
+        f.writelines(LINES)
+    if md5:
+        with open(path, 'rb') as f, open(path + '.md5', 'w') as out:
+            out.write('%s  nucl_gb.accession2taxid.gz\n' % hashlib.md5(
+                f.read()).hexdigest())
+    return path
+
+
+def test_lines(tmp_path):
+    assert list(pipeline.lines(_gzipped(tmp_path))) == LINES
+
+
+def test_lines_without_md5(tmp_path):
+    assert list(pipeline.lines(_gzipped(tmp_path, md5=False))) == LINES
+
+
+def test_md5_mismatch(tmp_path):
+    path = _gzipped(tmp_path)
+    with open(path + '.md5', 'w') as f:
+        f.write('0' * 32)
+    with pytest.raises(IOError):
+        list(pipeline.lines(path))
+
+
+def test_lines_http(tmp_path):
+    path = _gzipped(tmp_path)
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler,
+        directory=os.path.dirname(path))
+    server = http.server.HTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = 'http://127.0.0.1:%d/%s' % (
+            server.server_port, os.path.basename(path))
+        assert list(pipeline.lines(url)) == LINES
+    finally:
+        server.shutdown()
+
+
+def _rows(dbname):
+    conn = sqlite3.connect(dbname)
+    try:
+        taxa = conn.execute('SELECT ncbi_taxid, parent_taxid, tax_name, '
+                            'lineage_level FROM taxa ORDER BY 1').fetchall()
+        gb = conn.execute('SELECT accession, taxid_id FROM gb').fetchall()
+    finally:
+        conn.close()
+    return taxa, sorted(gb)
+
+
+def test_create_pipeline(make_dump, create_db):
+    outdir = make_dump(accessions={'nucl_gb.accession2taxid.gz': GB})
+    taxa, gb = _rows(create_db(input=outdir, pipeline=True))
+    assert taxa == [(1, 1, 'root', 'no rank'),
+                    (2, 1, 'Bacteria', 'superkingdom'),
+                    (3, 2, 'Escherichia coli', 'species')]
+    assert gb == sorted(GB)
+
+
+def test_create_url(make_dump, create_db):
+    outdir = make_dump(accessions={'nucl_gb.accession2taxid.gz': GB},
+                       mirror=True)
+    taxa, gb = _rows(create_db(input=None, url=pathlib.Path(outdir).as_uri()))
+    assert [t[0] for t in taxa] == [1, 2, 3]
+    assert gb == sorted(GB)
+
+
+def test_create_url_md5_mismatch(make_dump, create_db):
+    outdir = make_dump(accessions={'nucl_gb.accession2taxid.gz': GB},
+                       mirror=True)
+    with open(os.path.join(outdir, 'taxdump.tar.gz.md5'), 'w') as f:
+        f.write('0' * 32)
+    with pytest.raises(IOError):
+        create_db(input=None, url=pathlib.Path(outdir).as_uri())
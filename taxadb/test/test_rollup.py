@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+
+import numpy as np
+
+from taxadb import app
+from taxadb import arrays
+from taxadb import rollup
+
+# the tree of _taxonomy, as (taxid, parent, name, rank) rows of a database
+TAXA = [
+    (1, 1, 'root', 'no rank'),
+    (2, 1, 'A', 'superkingdom'),
+    (3, 2, 'B', 'genus'),
+    (4, 2, 'C', 'genus'),
+    (5, 3, 'D', 'species'),
+    (6, 1, 'E', 'superkingdom')]
+
+
+def _taxonomy():
+    # 1 (root) -> 2 (superkingdom) -> 3 (genus) -> 5 (species)
+    #                             -> 4 (genus)
+    #          -> 6 (superkingdom)
+    return arrays.Taxonomy(
+        taxid=np.array([1, 2, 3, 4, 5, 6]),
+        parent=np.array([0, 0, 1, 1, 2, 0]),
+        rank=np.array([0, 1, 2, 2, 3, 1], dtype=np.int32),
+        name=np.arange(6),
+        ranks=np.array(['no rank', 'superkingdom', 'genus', 'species'],
+                       dtype=object),
+        names=np.array(['root', 'A', 'B', 'C', 'D', 'E'], dtype=object))
+
+
+def test_depth():
+    assert rollup.depth(_taxonomy()).tolist() == [0, 1, 2, 2, 3, 1]
+
+
+def test_rollup():
+    clades, totals = rollup._rollup(
+        _taxonomy(), np.array([1, 10, 100, 1000]), [5, 4, 6, 99], None)
+    assert dict(zip(clades.tolist(), totals.tolist())) == {
+        1: 111, 2: 11, 3: 1, 4: 10, 5: 1, 6: 100}
+
+
+def test_rollup_samples_ranks():
+    counts = np.array([[1, 2], [10, 20], [3, 0]])
+    clades, totals = rollup._rollup(
+        _taxonomy(), counts, [5, 4, 3], ['genus'])
+    assert clades.tolist() == [3, 4]
+    assert totals.tolist() == [[4, 2], [10, 20]]
+
+
+def test_rollup_db(make_db):
+    dbname = make_db(taxa=TAXA)
+    counts = {5: 1, 4: 10, 6: 100}
+    assert rollup.rollup(counts, dbname, dbtype='sqlite') == {
+        1: 111, 2: 11, 3: 1, 4: 10, 5: 1, 6: 100}
+    assert rollup.rollup(counts, dbname, ranks=['superkingdom'],
+                         dbtype='sqlite') == {2: 11, 6: 100}
+    # unknown taxids are ignored
+    assert rollup.rollup({5: 1, 99: 1000}, dbname, dbtype='sqlite') == {
+        1: 1, 2: 1, 3: 1, 5: 1}
+    assert rollup.rollup({99: 1000}, dbname, dbtype='sqlite') == {}
+
+
+def test_rollup_array_db(make_db):
+    dbname = make_db(taxa=TAXA)
+    clades, totals = rollup.rollup(np.array([[1, 2], [10, 20], [3, 0]]),
+                                   dbname, taxids=[5, 4, 99],
+                                   ranks=['genus', 'species'], dbtype='sqlite')
+    assert clades.tolist() == [3, 4, 5]
+    assert totals.tolist() == [[1, 2], [10, 20], [1, 2]]
+
+
+def test_rollup_file(tmp_path, make_db):
+    dbname = make_db(taxa=TAXA)
+    counts = str(tmp_path / 'counts.tsv')
+    with open(counts, 'w') as f:
+        f.write('taxid\ts1\ts2\n5\t1\t0.5\n4\t10\t2\n99\t7\t7\n')
+    output = str(tmp_path / 'clades.tsv')
+    assert rollup.rollup_file(counts, output, dbname, ['genus'],
+                               dbtype='sqlite') == 2
+    with open(output) as f:
+        assert f.read() == ('taxid\trank\tname\ts1\ts2\n'
+                            '3\tgenus\tB\t1.0\t0.5\n'
+                            '4\tgenus\tC\t10.0\t2.0\n')
+
+
+def test_rollup_command(tmp_path, make_db, capsys):
+    dbname = make_db(taxa=TAXA)
+    counts = str(tmp_path / 'counts.tsv')
+    with open(counts, 'w') as f:
+        f.write('5\t1\n6\t100\n')
+    output = str(tmp_path / 'clades.tsv')
+    app.rollup_counts(argparse.Namespace(
+        input=counts, output=output, ranks=None, dbname=dbname,
+        dbtype='sqlite', hostname='localhost', username=None, password=None,
+        port=None, readonly=True, mmap_size=1 << 20, cache_size=1024))
+    assert capsys.readouterr().out == '5 clades written\n'
+    with open(output) as f:
+        assert f.read().splitlines() == [
+            'taxid\trank\tname\tcount1',
+            '1\tno rank\troot\t101',
+            '2\tsuperkingdom\tA\t1',
+            '3\tgenus\tB\t1',
+            '5\tspecies\tD\t1',
+            '6\tsuperkingdom\tE\t100']
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sqlite3
+import urllib.parse
+
+import pytest
+
+from taxadb.schema import *
+from taxadb import schema
+
+
+def _readonly(dbname, **kwargs):
+    database = DatabaseFactory(dbname=dbname, dbtype='sqlite', readonly=True,
+                               **kwargs).get_database()
+    database.connect()
+    return database
+
+
+def _pragma(database, name):
+    return database.execute_sql('PRAGMA %s' % name).fetchone()[0]
+
+
+def test_readonly(make_db):
+    dbname = make_db()
+    database = _readonly(dbname, mmap_size=1 << 20, cache_size=1024)
+    uri = urllib.parse.urlsplit(database.database)
+    assert uri.scheme == 'file'
+    assert urllib.parse.unquote(uri.path) == os.path.abspath(dbname)
+    assert urllib.parse.parse_qs(uri.query) == {'mode': ['ro'],
+                                                'immutable': ['1']}
+    assert _pragma(database, 'mmap_size') == 1 << 20
+    assert _pragma(database, 'cache_size') == -1024
+    assert _pragma(database, 'query_only') == 1
+    assert database.execute_sql(
+        'SELECT tax_name FROM taxa WHERE ncbi_taxid = 2').fetchone() == (
+        'Bacteria',)
+    database.close()
+
+
+def test_readonly_defaults(make_db):
+    database = _readonly(make_db())
+    assert dict(database._pragmas) == {'mmap_size': 1 << 34,
+                                       'cache_size': -65536,
+                                       'query_only': 1}
+    assert _pragma(database, 'cache_size') == -65536
+    database.close()
+
+
+def test_readonly_rejects_writes(make_db):
+    database = _readonly(make_db())
+    with pytest.raises(pw.OperationalError):
+        database.execute_sql(
+            "INSERT INTO taxa VALUES (4, 2, 'Shigella', 'genus')")
+    database.close()
+
+
+def test_wal(make_db):
+    dbname = make_db()
+    assert not schema._sqlite_wal(dbname)
+    conn = sqlite3.connect(dbname)
+    conn.execute('PRAGMA journal_mode=wal')
+    conn.close()
+    assert schema._sqlite_wal(dbname)
+    # a WAL database can be written by another process while it is read:
+    # it is not opened as immutable
+    database = _readonly(dbname)
+    query = urllib.parse.urlsplit(database.database).query
+    assert urllib.parse.parse_qs(query) == {'mode': ['ro']}
+    assert database.execute_sql('SELECT COUNT(*) FROM taxa').fetchone() == (3,)
+    database.close()
+
+
+def test_readonly_missing(tmp_path, capsys):
+    dbname = str(tmp_path / 'missing.sqlite')
+    with pytest.raises(SystemExit) as error:
+        DatabaseFactory(dbname=dbname, dbtype='sqlite',
+                        readonly=True).get_database()
+    assert error.value.code == 1
+    assert '%s does not exist' % dbname in capsys.readouterr().err
+    assert not os.path.exists(dbname)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import collections
+import os
+from unittest import mock
+
+from taxadb.schema import *
+from taxadb import accession
+from taxadb import arrays
+from taxadb import shard
+
+
+def test_index():
+    assert shard.index('X17276', 8) == shard.index('X17276', 8)
+    assert {shard.index('X%05d' % i, 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def _connect(dbname):
+    database = DatabaseFactory(dbname=dbname, dbtype='sqlite').get_database()
+    db.initialize(database)
+    db.connect()
+
+
+def test_sharded_lookup(make_db):
+    dbname = make_db()
+    _connect(dbname)
+    shard.create(Gb, 4)
+    writer = shard.Writer(Gb, 4, dbname)
+    writer.insert([{'accession': 'X%05d' % i, 'taxid': 2}
+                   for i in range(100)])
+    writer.close()
+    assert shard.count(Gb) == 4
+    assert Gb.select().count() == 0
+    db.close()
+    for i in range(4):
+        assert os.path.exists(shard.path(dbname, 'gb', i))
+    taxids = sorted(accession.taxid(
+        ['X00003', 'X00042', 'X00100'], dbname, Gb, dbtype='sqlite'))
+    assert taxids == [('X00003', 2), ('X00042', 2)]
+    lineages = list(accession.lineage_name(
+        ['X00007'], dbname, dbtype='sqlite'))
+    assert lineages == [('X00007', ['Bacteria'])]
+
+
+def test_writer_transaction(tmp_path):
+    dbname = str(tmp_path / 'shard.sqlite')
+    writer = shard.Writer(Gb, 2, dbname)
+    writer.insert([{'accession': 'X%05d' % i, 'taxid': 2}
+                   for i in range(100)])
+    # the rows are not committed until close
+    assert all(d.get_conn().in_transaction for d in writer.databases)
+    writer.close()
+    rows = list(shard.rows(Gb, 2, dbname))
+    assert len(rows) == 100
+
+
+def test_lookup_chunked(make_db):
+    dbname = make_db()
+    _connect(dbname)
+    shard.create(Gb, 2)
+    writer = shard.Writer(Gb, 2, dbname)
+    writer.insert([{'accession': 'X%05d' % i, 'taxid': 2}
+                   for i in range(2000)])
+    writer.close()
+    db.close()
+    accessions = ['X%05d' % i for i in range(2001)]
+    with mock.patch.object(shard.Reader, '_query', autospec=True,
+                           side_effect=shard.Reader._query) as query, \
+            mock.patch.object(shard, 'DatabaseFactory',
+                              wraps=DatabaseFactory) as factory:
+        taxids = arrays.accession_taxid(accessions, dbname, Gb,
+                                        dbtype='sqlite', snapshot=False)
+    assert taxids.tolist() == [2] * 2000 + [arrays.MISSING]
+    # each shard is opened once for the whole call, and looked up in chunks
+    assert factory.call_count == 2
+    sizes = [len(c[0][1][1]) for c in query.call_args_list]
+    assert max(sizes) <= arrays.CHUNK
+    per_shard = collections.Counter(shard.index(a, 2) for a in accessions)
+    assert len(sizes) == sum(-(-n // arrays.CHUNK) for n in per_shard.values())
+    rows = list(accession.taxid(accessions, dbname, Gb, dbtype='sqlite'))
+    assert len(rows) == 2000
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import sys
+
+from taxadb.schema import *
+from taxadb import arrays
+from taxadb import snapshot
+
+# 10 gb accessions, of taxid 3
+GB = [{'accession': 'A%d' % i, 'taxid': 3} for i in range(10)]
+
+
+def test_taxonomy(make_db):
+    dbname = make_db({Gb: GB})
+    expected = arrays.taxonomy(dbname, dbtype='sqlite')
+    arrays.save_snapshot(dbname, dbtype='sqlite')
+    snap = snapshot.load(snapshot.path(dbname, dbtype='sqlite'))
+    tax = arrays.Taxonomy(**snap.taxonomy)
+    for field in ['taxid', 'parent', 'rank', 'name']:
+        assert (getattr(tax, field) == getattr(expected, field)).all()
+    assert list(tax.ranks) == list(expected.ranks)
+    assert list(tax.names) == list(expected.names)
+    batch = arrays._batch(tax, [3, 4])
+    assert list(batch.names[batch.name[:1]]) == ['Escherichia coli']
+
+
+def test_hot_accessions(make_db):
+    dbname = make_db({Gb: GB})
+    arrays.save_snapshot(dbname, hot_accessions=['A1', 'A2', 'B1'], table=Gb,
+                         dbtype='sqlite')
+    snap = snapshot.get(dbname, dbtype='sqlite')
+    assert snap.accessions.tolist() == [b'A1', b'A2']
+    assert arrays._hot_taxids(snap, ['A2', 'A3']).tolist() == [3, -1]
+
+    # change the database behind the snapshot, without changing its size and
+    # time: the hot accessions are answered by the snapshot, the others by
+    # the database
+    stat = os.stat(dbname)
+    database = DatabaseFactory(dbname=dbname, dbtype='sqlite').get_database()
+    db.initialize(database)
+    db.connect()
+    Gb.update(taxid=2).execute()
+    db.close()
+    os.utime(dbname, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    taxids = arrays.accession_taxid(['A3', 'A1', 'A3', 'B1'], dbname, Gb,
+                                    dbtype='sqlite')
+    assert taxids.tolist() == [2, 3, 2, -1]
+
+
+def test_hot_table(make_db):
+    # A1 is in gb and in prot, with different taxids
+    dbname = make_db({Gb: GB, Prot: [{'accession': 'A1', 'taxid': 2}]})
+    arrays.save_snapshot(dbname, hot_accessions=['A1'], table=Gb,
+                         dbtype='sqlite')
+    assert snapshot.get(dbname, dbtype='sqlite').table == 'gb'
+    # the hot accessions of gb do not answer the lookups in prot
+    assert arrays.accession_taxid(['A1'], dbname, Prot,
+                                  dbtype='sqlite').tolist() == [2]
+    assert arrays.accession_taxid(['A1'], dbname, Gb,
+                                  dbtype='sqlite').tolist() == [3]
+
+
+def _connect(dbname):
+    database = DatabaseFactory(dbname=dbname, dbtype='sqlite').get_database()
+    db.initialize(database)
+    db.connect()
+
+
+def test_snapshot_again(make_db):
+    dbname = make_db({Gb: GB})
+    arrays.save_snapshot(dbname, dbtype='sqlite')
+    # rename a taxon, without changing the size and time of the database, so
+    # that the snapshot is still used: the new snapshot must be read from
+    # the database, not from the previous snapshot
+    stat = os.stat(dbname)
+    _connect(dbname)
+    Taxa.update(tax_name='E. coli').where(Taxa.ncbi_taxid == 3).execute()
+    db.close()
+    os.utime(dbname, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert snapshot.get(dbname, dbtype='sqlite') is not None
+    arrays.save_snapshot(dbname, dbtype='sqlite')
+    batch = arrays.taxa([3], dbname, dbtype='sqlite')
+    assert batch.names[batch.name[0]] == 'E. coli'
+
+
+def test_fingerprint(make_db):
+    dbname = make_db({Gb: GB})
+    _connect(dbname)
+    keys = snapshot.fingerprint()
+    assert keys == [3, None, 10, None, None, None]
+    Taxa.insert(ncbi_taxid=4, parent_taxid=2, tax_name='Shigella',
+                lineage_level='genus').execute()
+    assert snapshot.fingerprint() == [4, None, 10, None, None, None]
+    db.close()
+
+
+def test_stale(make_db):
+    dbname = make_db({Gb: GB})
+    arrays.save_snapshot(dbname, dbtype='sqlite')
+    assert snapshot.get(dbname, dbtype='sqlite') is not None
+    assert snapshot.get(dbname, dbtype='sqlite', snapshot=False) is None
+    stat = os.stat(dbname)
+    os.utime(dbname, (stat.st_atime, stat.st_mtime + 10))
+    assert snapshot.get(dbname, dbtype='sqlite') is None
+
+
+def test_no_import_cycle():
+    # snapshot is the on-disk format, which arrays builds upon
+    script = 'import taxadb.snapshot, sys; print("taxadb.arrays" in sys.modules)'
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    output = subprocess.check_output([sys.executable, '-c', script], env=env)
+    assert output.strip() == b'False'
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import sqlite3
+import sys
+import tracemalloc
+from unittest import mock
+
+from taxadb.schema import *
+from taxadb import accession
+from taxadb import metrics
+
+SEQUENCES = 30000
+
+# SEQUENCES gb accessions, all mapped to taxid 2
+GB = [{'accession': 'A%07d' % i, 'taxid': 2} for i in range(SEQUENCES)]
+
+
+def _peak(function, dbname, batch):
+    """Peak memory allocated while reading the results of a batch"""
+    accessions = ['A%07d' % i for i in range(batch)]
+    tracemalloc.start()
+    try:
+        rows = 0
+        for row in function(accessions, dbname, Gb, fetch_size=100,
+                            dbtype='sqlite'):
+            rows += 1
+        assert rows == batch
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_constant_memory(make_db, monkeypatch):
+    dbname = make_db({Gb: GB})
+    monkeypatch.setattr(accession, 'CHUNK', 1000)
+    for function in [accession.taxid, accession.lineage_id]:
+        small = _peak(function, dbname, SEQUENCES // 10)
+        large = _peak(function, dbname, SEQUENCES)
+        assert large < small * 2
+
+
+def test_lineage_resolved_once(make_db, monkeypatch):
+    dbname = make_db({Gb: GB})
+    # below the variable limit of any SQLite
+    monkeypatch.setattr(accession, 'CHUNK', 500)
+    collector = metrics.add_hook(metrics.Collector())
+    try:
+        lineages = list(accession.lineage_name(
+            ['A%07d' % i for i in range(SEQUENCES)], dbname, Gb,
+            dbtype='sqlite'))
+    finally:
+        metrics.remove_hook(collector)
+    assert len(lineages) == SEQUENCES
+    assert all(lineage == ['Bacteria'] for acc, lineage in lineages)
+    # one query per chunk of accessions, and one for the parents of taxid 2
+    assert collector.counters['accession.queries'] == SEQUENCES // 500 + 1
+
+
+def test_sqlite_variable_limit(make_db):
+    dbname = make_db({Gb: GB})
+    database = DatabaseFactory(dbname=dbname, dbtype='sqlite').get_database()
+    db.initialize(database)
+    db.connect()
+    # the limit of SQLite before 3.32
+    db.get_conn().setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    assert accession._chunk() == 999
+    collector = metrics.add_hook(metrics.Collector())
+    try:
+        rows = list(accession._select(
+            Gb, ['A%07d' % i for i in range(3000)], dbname, 'test'))
+    finally:
+        metrics.remove_hook(collector)
+        db.close()
+    assert len(rows) == 3000
+    assert collector.counters['accession.queries'] == 4
+
+
+def _mock_cursor():
+    """A DB-API cursor returning 3 rows, 2 rows per fetchmany"""
+    cursor = mock.MagicMock()
+    cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+    return cursor
+
+
+def test_stream_postgres():
+    database = pw.PostgresqlDatabase('taxadb')
+    cursor = _mock_cursor()
+    conn = mock.MagicMock()
+    conn.cursor.return_value = cursor
+    db.initialize(database)
+    with mock.patch.object(database, 'get_conn', return_value=conn):
+        rows = list(stream(Taxa.select(Taxa.ncbi_taxid), fetch_size=2))
+    assert rows == [(1,), (2,), (3,)]
+    # a named cursor is a server-side cursor in psycopg2
+    assert conn.cursor.call_args[1]['name'].startswith('taxadb_stream_')
+    assert cursor.itersize == 2
+    assert cursor.fetchmany.call_args_list == [mock.call(2)] * 3
+    cursor.close.assert_called_once_with()
+
+
+def test_stream_mysql():
+    database = pw.MySQLDatabase('taxadb')
+    cursor = _mock_cursor()
+    conn = mock.MagicMock()
+    conn.cursor.return_value = cursor
+    pymysql = mock.MagicMock()
+    modules = {'pymysql': pymysql, 'pymysql.cursors': pymysql.cursors}
+    db.initialize(database)
+    with mock.patch.dict(sys.modules, modules), \
+            mock.patch.object(database, 'get_conn', return_value=conn):
+        rows = list(stream(Taxa.select(Taxa.ncbi_taxid), fetch_size=2))
+    assert rows == [(1,), (2,), (3,)]
+    conn.cursor.assert_called_once_with(pymysql.cursors.SSCursor)
+    assert cursor.fetchmany.call_args_list == [mock.call(2)] * 3
+    cursor.close.assert_called_once_with()
@@ -2,6 +2,10 @@
 # -*- coding: utf-8 -*-
 
 import hashlib
+import os
+
+# where the files derived from MySQL and PostgreSQL databases are stored
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'taxadb')
 
 
 def md5_check(file, block_size=256*128):
@@ -19,3 +23,36 @@ def md5_check(file, block_size=256*128):
             file_md5.update(chunk)
     assert(file_md5.hexdigest() == md5)
     print('Done!!')
+
+
+def accession_prefix(accession):
+    """Return the prefix of an accession number, i.e. the characters before
+    its first digit (e.g.: X for X17276, XP_ for XP_001234)
+
+    Arguments:
+    accession -- an accession number
+    """
+    for i, char in enumerate(accession):
+        if char.isdigit():
+            return accession[:i]
+    return accession
+
+
+def database_file(db_name, suffix, **kwargs):
+    """Return the path of a file derived from a database (e.g. a bloom
+    filter). It is next to sqlite databases, and in CACHE_DIR for the other
+    database types, named after the whole connection (type, host, port and
+    database name) so that the files of two databases never collide.
+
+    Arguments:
+    db_name -- the path to (or name of) the database
+    suffix -- the suffix of the file (e.g.: gb.bloom)
+    kwargs -- the options of the database (dbtype/hostname/port)
+    """
+    dbtype = kwargs.get('dbtype') or 'sqlite'
+    if dbtype == 'sqlite':
+        return os.path.abspath('%s.%s' % (db_name, suffix))
+    identity = '%s-%s-%s-%s' % (dbtype, kwargs.get('hostname') or 'localhost',
+                                kwargs.get('port') or 'default', db_name)
+    return os.path.join(CACHE_DIR, '%s.%s' % (
+        identity.replace(os.sep, '_'), suffix))